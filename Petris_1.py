@@ -1,7 +1,12 @@
 import pygame
+import asyncio
 import random
 import time
 import sys
+import math
+import argparse
+import atexit
+from collections import deque
 
 pygame.init()
 
@@ -13,7 +18,9 @@ COLUMNS = 10
 ROWS = 20
 GAME_WIDTH = COLUMNS * BLOCK_SIZE  # 300
 GAME_HEIGHT = ROWS * BLOCK_SIZE  # 600
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+FPS = 60
+ATTRACT_IDLE = 20  # Seconds of no input on the main menu before a bot game plays behind it
+ATTRACT_FPS = 30  # Menu frame rate while it does
 
 
 class Colors:
@@ -46,57 +53,347 @@ class Shapes:
     SHAPES_COLORS = [Colors.CYAN, Colors.BLUE, Colors.ORANGE, Colors.YELLOW, Colors.GREEN, Colors.PURPLE, Colors.RED]
 
     @staticmethod
-    def new_piece():
-        shape = random.choice(Shapes.SHAPES)
-        color = random.choice(Shapes.SHAPES_COLORS)
+    def new_piece(rng=random):
+        shape = rng.choice(Shapes.SHAPES)
+        color = rng.choice(Shapes.SHAPES_COLORS)
         return shape, color
 
+    @staticmethod
+    def rotations(shape):
+        # All distinct rotations of a shape, in the order rotate_piece produces them
+        result = [shape]
+        for _ in range(3):
+            shape = [list(row) for row in zip(*shape[::-1])]
+            if shape not in result:
+                result.append(shape)
+        return result
+
+
+# Fixed seed so hashes are identical across runs and worker processes
+_zobrist_random = random.Random(0x7E7215)
+
+
+class Zobrist:
+    # 64-bit random key for every occupied cell and for every piece orientation
+    CELLS = [[_zobrist_random.getrandbits(64) for _ in range(COLUMNS)] for _ in range(ROWS)]
+    PIECES = {}
+    for _shape in Shapes.SHAPES:
+        for _rotation in Shapes.rotations(_shape):
+            PIECES[tuple(map(tuple, _rotation))] = _zobrist_random.getrandbits(64)
+    del _shape, _rotation
+    BOARD_CELLS = {(COLUMNS, ROWS): CELLS}
+
+    @staticmethod
+    def piece_key(shape):
+        return Zobrist.PIECES[tuple(map(tuple, shape))]
 
-def draw_grid():
-    # Only draw grid within the game area
-    for x in range(0, GAME_WIDTH, BLOCK_SIZE):
-        pygame.draw.line(screen, Colors.GRAY, (x, 0), (x, GAME_HEIGHT))
-    for y in range(0, GAME_HEIGHT, BLOCK_SIZE):
-        pygame.draw.line(screen, Colors.GRAY, (0, y), (GAME_WIDTH, y))
+    @staticmethod
+    def cells(columns, rows):
+        # Cell keys for a board size, seeded by the size so every process agrees
+        cells = Zobrist.BOARD_CELLS.get((columns, rows))
+        if cells is None:
+            size_random = random.Random(f"zobrist {columns}x{rows}")
+            cells = [[size_random.getrandbits(64) for _ in range(columns)] for _ in range(rows)]
+            Zobrist.BOARD_CELLS[(columns, rows)] = cells
+        return cells
+
+
+def shape_profile(shape):
+    # Row bitmasks of a shape as (row index, mask) for its non-empty rows, plus the
+    # first and one past the last filled column
+    rows = []
+    occupied = 0
+    for i, row in enumerate(shape):
+        mask = 0
+        for j, cell in enumerate(row):
+            if cell:
+                mask |= 1 << j
+        if mask:
+            rows.append((i, mask))
+            occupied |= mask
+    return rows, (occupied & -occupied).bit_length() - 1, occupied.bit_length()
+
+
+# Gravity is measured in cells per tick as a 16.16 fixed-point number
+GRAVITY_SHIFT = 16
+GRAVITY_ONE = 1 << GRAVITY_SHIFT
+MAX_GRAVITY = ROWS * GRAVITY_ONE  # 20G: top speed, applied as an instant drop on any board
+
+
+def build_gravity_table(base_delay=0.5, factor=0.7):
+    # Every speed level drops 30% faster than the one before, up to 20G
+    table = []
+    delay = base_delay
+    while not table or table[-1] < MAX_GRAVITY:
+        table.append(min(MAX_GRAVITY, round(GRAVITY_ONE / (delay * FPS))))
+        delay *= factor
+    return table
+
+
+GRAVITY_TABLE = build_gravity_table()
+
+
+def speed_level(score):
+    # Number of speed thresholds reached. The thresholds are 1000, 3000, then a gap of
+    # 2000 that grows by 1000 per level (5000, 8000, 12000, 17000, ...): from the
+    # second on, threshold k is 500 * (k * k - k + 4), which inverts in closed form.
+    if score < 3000:
+        return 1 if score >= 1000 else 0
+    return (math.isqrt(4 * (score // 500) - 15) + 1) // 2
+
+
+class Hooks:
+    # Event hooks for bots, telemetry, sound and animations. A hook nobody subscribed to
+    # is the class attribute None, so call sites only pay for an attribute check. One
+    # subscriber is called directly; several are called through a small dispatcher.
+    HOOKS = ()
+
+    def add_hook(self, name, callback):
+        if name not in self.HOOKS:
+            raise ValueError(f"Unknown hook: {name}")
+        callbacks = self.__dict__.setdefault("hook_callbacks", {}).setdefault(name, [])
+        callbacks.append(callback)
+        self.bind_hook(name)
+
+    def remove_hook(self, name, callback):
+        self.hook_callbacks[name].remove(callback)
+        self.bind_hook(name)
+
+    def bind_hook(self, name):
+        callbacks = tuple(self.hook_callbacks.get(name, ()))
+        if not callbacks:
+            self.__dict__.pop(name, None)
+        elif len(callbacks) == 1:
+            setattr(self, name, callbacks[0])
+        else:
+            def dispatch(*args):
+                for callback in callbacks:
+                    callback(*args)
+            setattr(self, name, dispatch)
 
 
-class GameField:
+class FrameClock:
+    # Async replacement for pygame.time.Clock. tick() waits for the next frame with
+    # asyncio.sleep, so other tasks (saves, telemetry, network) run between frames.
     def __init__(self):
+        self.last_tick = time.perf_counter()
+
+    async def tick(self, framerate=0):
+        if framerate:
+            delay = self.last_tick + 1 / framerate - time.perf_counter()
+            await asyncio.sleep(max(0, delay))
+        else:
+            await asyncio.sleep(0)
+        now = time.perf_counter()
+        elapsed = now - self.last_tick
+        self.last_tick = now
+        return int(elapsed * 1000)
+
+
+background_tasks = set()
+
+
+def run_in_background(coroutine):
+    # Start a task that outlives the current screen (file writes, uploads)
+    task = asyncio.get_running_loop().create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def draw_grid(screen, columns=COLUMNS, rows=ROWS, block_size=BLOCK_SIZE):
+    # Only draw grid within the game area, and not when the blocks are too small for it
+    if block_size < 6:
+        return
+    width = columns * block_size
+    height = rows * block_size
+    for x in range(0, width, block_size):
+        pygame.draw.line(screen, Colors.GRAY, (x, 0), (x, height))
+    for y in range(0, height, block_size):
+        pygame.draw.line(screen, Colors.GRAY, (0, y), (width, y))
+
+
+def fit_block_size(game_field):
+    # Largest block that fits the board into the game area
+    return max(1, min(GAME_WIDTH // game_field.columns, GAME_HEIGHT // game_field.rows))
+
+
+class GameField:
+    def __init__(self, columns=COLUMNS, rows=ROWS):
+        self.columns = columns
+        self.rows = rows
         self.board = []
-        for i in range(ROWS):
-            self.board.append([Colors.BLACK] * COLUMNS)
+        for i in range(rows):
+            self.board.append([Colors.BLACK] * columns)
+        # Occupancy of every row as an int, bit j set for a filled cell in column j.
+        # Python ints have no fixed width, so this works for any number of columns.
+        self.masks = [0] * rows
+        self.full_mask = (1 << columns) - 1
+        # Zobrist hash of the board occupancy, kept up to date by place_shape and clear_lines
+        self.zobrist = Zobrist.cells(columns, rows)
+        self.hash = 0
+        # Skyline: height of the highest filled cell in every column
+        self.heights = [0] * columns
 
-    def clear_lines(self):
-        full_lines = []
-        for i, row in enumerate(self.board):
-            if all(cell != Colors.BLACK for cell in row):
-                full_lines.append(i)
+    @staticmethod
+    def from_board(board):
+        field = GameField(len(board[0]), len(board))
+        field.board = board
+        field.masks = [field.scan_row(i) for i in range(field.rows)]
+        for i in range(field.rows):
+            field.hash ^= field.row_hash(i)
+        field.heights = [field.column_height(j) for j in range(field.columns)]
+        return field
+
+    def copy(self):
+        field = GameField.__new__(GameField)
+        field.columns = self.columns
+        field.rows = self.rows
+        field.board = [row[:] for row in self.board]
+        field.masks = self.masks[:]
+        field.full_mask = self.full_mask
+        field.zobrist = self.zobrist
+        field.hash = self.hash
+        field.heights = self.heights[:]
+        return field
+
+    def column_height(self, j, start=0):
+        # Scans down from row start; every row above it must be empty in column j
+        bit = 1 << j
+        masks = self.masks
+        for i in range(start, self.rows):
+            if masks[i] & bit:
+                return self.rows - i
+        return 0
+
+    def row_hash(self, i):
+        # Only the filled cells are visited
+        h = 0
+        keys = self.zobrist[i]
+        mask = self.masks[i]
+        while mask:
+            low = mask & -mask
+            h ^= keys[low.bit_length() - 1]
+            mask ^= low
+        return h
+
+    def scan_row(self, i):
+        # Row mask computed from the colors, for fields built from a plain board
+        mask = 0
+        for j, cell in enumerate(self.board[i]):
+            if cell != Colors.BLACK:
+                mask |= 1 << j
+        return mask
+
+    def row_mask(self, i):
+        # Occupancy of row i as a bitmask, bit j set for a filled cell in column j
+        return self.masks[i]
+
+    def place_shape(self, shape, color, x, y):
+        for i, row in enumerate(shape):
+            for j, cell in enumerate(row):
+                if cell:
+                    self.board[y + i][x + j] = color
+                    self.masks[y + i] |= 1 << (x + j)
+                    self.hash ^= self.zobrist[y + i][x + j]
+                    if self.rows - y - i > self.heights[x + j]:
+                        self.heights[x + j] = self.rows - y - i
+
+    def clear_lines(self, rows=None):
+        # rows limits the check to the rows a piece was just placed in (ascending)
+        masks = self.masks
+        full = self.full_mask
+        if rows is None:
+            rows = range(self.rows)
+        full_lines = [i for i in rows if masks[i] == full]
+
+        if not full_lines:
+            return 0
+
+        # Only the stack above the lowest cleared line moves; empty rows above the
+        # stack and the rows below keep their hash
+        last = full_lines[-1]
+        top = self.rows - max(self.heights)
+        for i in range(top, last + 1):
+            self.hash ^= self.row_hash(i)
 
         for i in full_lines:
             del self.board[i]
-            self.board.insert(0, [Colors.BLACK] * COLUMNS)
-
-        return len(full_lines)
-
-    def draw(self):
+            self.board.insert(0, [Colors.BLACK] * self.columns)
+            del masks[i]
+            masks.insert(0, 0)
+
+        for i in range(top, last + 1):
+            self.hash ^= self.row_hash(i)
+
+        # A column whose top cell survived just moves down; one whose top cell was
+        # cleared is rescanned from there
+        cleared = set(full_lines)
+        count = len(full_lines)
+        heights = self.heights
+        for j in range(self.columns):
+            column_top = self.rows - heights[j]
+            if column_top in cleared:
+                heights[j] = self.column_height(j, column_top)
+            else:
+                heights[j] -= count
+        return count
+
+    def add_garbage(self, count, hole):
+        # Push the stack up by count rows and fill the bottom with garbage rows that have
+        # an empty cell in the hole column. Returns False when filled cells were pushed out.
+        overflow = any(self.masks[:count])
+        del self.board[:count]
+        del self.masks[:count]
+        for _ in range(count):
+            row = [Colors.LIGHT_GRAY] * self.columns
+            row[hole] = Colors.BLACK
+            self.board.append(row)
+            self.masks.append(self.full_mask ^ (1 << hole))
+        self.hash = 0
+        for i in range(self.rows):
+            self.hash ^= self.row_hash(i)
+        self.heights = [self.column_height(j) for j in range(self.columns)]
+        return not overflow
+
+    def draw(self, screen, block_size=BLOCK_SIZE):
         for i, row in enumerate(self.board):
+            if not self.masks[i]:
+                continue
             for j, cell in enumerate(row):
                 if cell != Colors.BLACK:
                     pygame.draw.rect(
                         screen, cell,
-                        (j * BLOCK_SIZE, i * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
+                        (j * block_size, i * block_size, block_size, block_size)
                     )
 
 
-class Tetris:
-    def __init__(self, game_field, score):
+class Tetris(Hooks):
+    # on_move(tetris, dx, dy), on_rotate(tetris), on_lock(tetris, lines_cleared),
+    # on_spawn(tetris), on_game_over(tetris)
+    HOOKS = ("on_move", "on_rotate", "on_lock", "on_spawn", "on_game_over")
+    on_move = None
+    on_rotate = None
+    on_lock = None
+    on_spawn = None
+    on_game_over = None
+
+    def __init__(self, game_field, score, rng=random):
         self.game_field = game_field
         self.score = score
-        self.current_piece = Shapes.new_piece()
-        self.next_piece = Shapes.new_piece()  # Store the next piece
-        self.x = COLUMNS // 2 - len(self.current_piece[0]) // 2
+        self.rng = rng  # Pass a seeded random.Random for a reproducible piece sequence
+        self.current_piece = Shapes.new_piece(rng)
+        self.next_piece = Shapes.new_piece(rng)  # Store the next piece
+        self.x = self.spawn_x(self.current_piece[0])
         self.y = 0
         self.game_over = False
+        self.profile_shape = None  # Shape the cached shape_profile belongs to
+        self.profile = None
+
+    def spawn_x(self, shape):
+        # Centered by the number of rows of the shape, kept inside narrow boards
+        columns = self.game_field.columns
+        return max(0, min(columns // 2 - len(shape) // 2, columns - len(shape[0])))
 
     def rotate_piece(self):
         shape, color = self.current_piece
@@ -106,72 +403,142 @@ class Tetris:
 
         if self.check_collision(0, 0):
             self.current_piece = (original_shape, color)
+        elif self.on_rotate is not None:
+            self.on_rotate(self)
 
     def check_collision(self, offset_x, offset_y):
-        shape, color = self.current_piece
-        for i, row in enumerate(shape):
-            for j, cell in enumerate(row):
-                if cell:
-                    new_x = self.x + j + offset_x
-                    new_y = self.y + i + offset_y
-                    if new_x < 0 or new_x >= COLUMNS or new_y >= ROWS or new_y < 0:
-                        return True
-                    if new_y >= 0 and self.game_field.board[new_y][new_x] != Colors.BLACK:
-                        return True
+        # One AND per piece row against the board row masks
+        shape = self.current_piece[0]
+        if shape is not self.profile_shape:
+            self.profile_shape = shape
+            self.profile = shape_profile(shape)
+        rows, left, right = self.profile
+        field = self.game_field
+        x = self.x + offset_x
+        if x + left < 0 or x + right > field.columns:
+            return True
+        y = self.y + offset_y
+        masks = field.masks
+        for i, mask in rows:
+            row = y + i
+            if row < 0 or row >= field.rows:
+                return True
+            if masks[row] & (mask << x if x >= 0 else mask >> -x):
+                return True
         return False
 
     def place_piece(self):
         self.score.add_placement()  # add 10 points for placement
-        for i, row in enumerate(self.current_piece[0]):
-            for j, cell in enumerate(row):
-                if cell:
-                    self.game_field.board[self.y + i][self.x + j] = self.current_piece[1]
-        lines_cleared = self.game_field.clear_lines()
+        shape, color = self.current_piece
+        self.game_field.place_shape(shape, color, self.x, self.y)
+        lines_cleared = self.game_field.clear_lines(range(self.y, self.y + len(shape)))
+        if self.on_lock is not None:
+            self.on_lock(self, lines_cleared)
         self.score.add_score(lines_cleared)
 
+    def snapshot(self):
+        # Everything needed to put the game back into this exact state (used for rollback)
+        field = self.game_field
+        score = self.score
+        return ([row[:] for row in field.board], field.masks[:], field.hash, field.heights[:],
+                self.current_piece, self.next_piece, self.x, self.y, self.game_over,
+                self.rng.getstate(), score.score, score.streak, score.level, score.lines_cleared)
+
+    def restore(self, snapshot):
+        field = self.game_field
+        score = self.score
+        (board, masks, field.hash, heights, self.current_piece, self.next_piece, self.x, self.y,
+         self.game_over, rng_state, score.score, score.streak, score.level, score.lines_cleared) = snapshot
+        field.board = [row[:] for row in board]
+        field.masks = masks[:]
+        field.heights = heights[:]
+        self.rng.setstate(rng_state)
+
+    def state_hash(self):
+        # Board occupancy plus the current piece orientation
+        return self.game_field.hash ^ Zobrist.piece_key(self.current_piece[0])
+
+    def drop_distance(self):
+        # Rows the piece can fall before landing. When the piece is above the skyline in
+        # every column it covers this is O(1) in the board size; under an overhang it
+        # falls back to stepping with check_collision.
+        shape = self.current_piece[0]
+        heights = self.game_field.heights
+        rows = self.game_field.rows
+        distance = rows
+        for j in range(len(shape[0])):
+            bottom = len(shape) - 1
+            while bottom >= 0 and not shape[bottom][j]:
+                bottom -= 1
+            if bottom < 0:
+                continue
+            top = rows - heights[self.x + j]
+            if self.y + bottom >= top:
+                distance = 0
+                while not self.check_collision(0, distance + 1):
+                    distance += 1
+                return distance
+            distance = min(distance, top - self.y - bottom - 1)
+        return distance
+
+    def fall(self, rows):
+        # Apply rows cells of gravity; the piece locks as soon as a step cannot move it
+        distance = self.drop_distance()
+        if rows > distance:
+            self.y += distance
+            self.move_down()
+        else:
+            self.y += rows
+
     def drop(self):
-        while not self.check_collision(0, 1):
-            self.y += 1
+        self.y += self.drop_distance()
         self.place_piece()
+        self.spawn_piece()
+
+    def spawn_piece(self):
         # Set current piece to next piece and get a new next piece
         self.current_piece = self.next_piece
-        self.next_piece = Shapes.new_piece()
-        self.x = COLUMNS // 2 - len(self.current_piece[0]) // 2
+        self.next_piece = Shapes.new_piece(self.rng)
+        self.x = self.spawn_x(self.current_piece[0])
         self.y = 0
         if self.check_collision(0, 0):
             self.game_over = True
+        if self.on_spawn is not None:
+            self.on_spawn(self)
+        if self.game_over and self.on_game_over is not None:
+            self.on_game_over(self)
 
     def move_left(self):
         if not self.check_collision(-1, 0):
             self.x -= 1
+            if self.on_move is not None:
+                self.on_move(self, -1, 0)
 
     def move_right(self):
         if not self.check_collision(1, 0):
             self.x += 1
+            if self.on_move is not None:
+                self.on_move(self, 1, 0)
 
     def move_down(self):
         if not self.check_collision(0, 1):
             self.y += 1
+            if self.on_move is not None:
+                self.on_move(self, 0, 1)
         else:
             self.place_piece()
-            # Set current piece to next piece and get a new next piece
-            self.current_piece = self.next_piece
-            self.next_piece = Shapes.new_piece()
-            self.x = COLUMNS // 2 - len(self.current_piece[0]) // 2
-            self.y = 0
-            if self.check_collision(0, 0):
-                self.game_over = True
-
-    def draw(self):
+            self.spawn_piece()
+
+    def draw(self, screen, block_size=BLOCK_SIZE):
         for i, row in enumerate(self.current_piece[0]):
             for j, cell in enumerate(row):
                 if cell:
                     pygame.draw.rect(
                         screen, self.current_piece[1],
-                        ((self.x + j) * BLOCK_SIZE, (self.y + i) * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
+                        ((self.x + j) * block_size, (self.y + i) * block_size, block_size, block_size)
                     )
 
-    def draw_next_piece(self):
+    def draw_next_piece(self, screen):
         # Draw the "NEXT" label
         font = pygame.font.Font(None, 36)
         next_text = font.render("NEXT:", True, Colors.WHITE)
@@ -202,7 +569,12 @@ class Tetris:
                     )
 
 
-class Score:
+class Score(Hooks):
+    # on_clear(score, lines_cleared, bonus), on_level_up(score, level)
+    HOOKS = ("on_clear", "on_level_up")
+    on_clear = None
+    on_level_up = None
+
     def __init__(self):
         self.score = 0
         self.streak = 0
@@ -216,6 +588,7 @@ class Score:
         if lines_cleared > 0:
             self.lines_cleared += lines_cleared
             # Update level every 10 lines
+            previous_level = self.level
             self.level = self.lines_cleared // 10 + 1
 
             bonus = 0
@@ -234,10 +607,15 @@ class Score:
 
             self.score += bonus
             self.streak += 1
+
+            if self.on_clear is not None:
+                self.on_clear(self, lines_cleared, bonus)
+            if self.level != previous_level and self.on_level_up is not None:
+                self.on_level_up(self, self.level)
         else:
             self.streak = 0
 
-    def draw(self):
+    def draw(self, screen):
         # Draw score panel background
         panel_x = GAME_WIDTH + 10
         panel_y = 180
@@ -282,13 +660,22 @@ class HighScore:
             return 0
 
     def save_high_score(self, current_score):
+        if self.update(current_score):
+            self.write()
+        return self.high_score
+
+    def update(self, current_score):
+        # Update the in-memory high score, returns True when it has to be written
         if current_score > self.high_score:
             self.high_score = current_score
-            with open("highscore.txt", "w") as f:
-                f.write(str(self.high_score))
-        return self.high_score
+            return True
+        return False
+
+    def write(self):
+        with open("highscore.txt", "w") as f:
+            f.write(str(self.high_score))
 
-    def draw(self):
+    def draw(self, screen):
         # Draw high score at the bottom of the side panel
         font = pygame.font.Font(None, 28)
         high_score_text = font.render(f"HIGH SCORE:", True, Colors.WHITE)
@@ -298,8 +685,103 @@ class HighScore:
         screen.blit(high_score_value, (GAME_WIDTH + 20, SCREEN_HEIGHT - 50))
 
 
+class Leaderboard:
+    # One page of scores.ScorePages as a ranked table. The table is rendered into its own
+    # surface when the page changes, so drawing a frame is a single blit.
+    def __init__(self, pages, font):
+        self.pages = pages
+        self.font = font
+        self.rows = None
+        self.surface = None
+
+    def handle_key(self, key):
+        # LEFT/RIGHT turn the page
+        if key == pygame.K_LEFT:
+            self.pages.previous()
+        elif key == pygame.K_RIGHT:
+            self.pages.next()
+
+    def render(self):
+        surface = pygame.Surface((400, 300), pygame.SRCALPHA)
+        font = self.font
+        pygame.draw.rect(surface, Colors.PURPLE, (0, 0, 400, 270), 3)
+        columns = (20, 70, 160, 270)
+        for x, heading in zip(columns, ("#", "SCORE", "PLAYER", "DAY")):
+            surface.blit(font.render(heading, True, Colors.YELLOW), (x, 12))
+        rank = (self.pages.page() - 1) * self.pages.page_size
+        for i, game in enumerate(self.pages.rows):
+            values = (str(rank + i + 1), str(game.score), game.player[:10], game.day)
+            for x, value in zip(columns, values):
+                surface.blit(font.render(value, True, Colors.CYAN if x == columns[1] else Colors.WHITE),
+                             (x, 40 + i * 21))
+        if not self.pages.rows:
+            empty = font.render("No games yet", True, Colors.WHITE)
+            surface.blit(empty, (200 - empty.get_width() // 2, 40))
+        page = font.render(f"PAGE {self.pages.page()}   LEFT/RIGHT - Page", True, Colors.WHITE)
+        surface.blit(page, (200 - page.get_width() // 2, 275))
+        return surface
+
+    def draw(self, screen, top):
+        if self.pages.rows is not self.rows:
+            self.rows = self.pages.rows
+            self.surface = self.render()
+        screen.blit(self.surface, (SCREEN_WIDTH // 2 - 200, top))
+
+
+class AttractMode:
+    # Bot game playing behind the main menu while nobody touches the keys. The engine and
+    # bot run headless (NullRenderer) at logic_rate game ticks per second whatever the menu
+    # frame rate; the board is kept on its own surface, where wall.Board repaints only the
+    # cells that changed, so a menu frame just blits that surface.
+    def __init__(self, logic_rate=30, budget=0.002, block_size=BLOCK_SIZE, seed=0):
+        from bot import ExpectimaxBot
+        from wall import LABEL_HEIGHT, BlockAtlas
+        self.bot = ExpectimaxBot(depth=1, table_size=20000)
+        self.logic_rate = logic_rate
+        self.budget = budget
+        self.seed = seed
+        self.atlas = BlockAtlas(block_size)
+        self.font = pygame.font.Font(None, LABEL_HEIGHT + 4)
+        # Just the board; the score label wall.Board draws below it falls outside and is clipped
+        self.surface = pygame.Surface((COLUMNS * block_size, ROWS * block_size))
+        self.surface.set_alpha(110)  # Dim, so the options stay readable on top
+        self.new_game()
+
+    def new_game(self):
+        from wall import Board
+        self.game = Game(self.bot, move_budget=self.budget, seed=self.seed, renderer=NullRenderer())
+        self.seed += 1
+        self.board = Board(self.game, 0, 0, self.atlas, self.font)
+        self.surface.fill(Colors.BLACK)
+        self.last_update = time.perf_counter()
+        self.pending_ticks = 0.0
+
+    def update(self):
+        # Catch the game up with the time since the last frame, at most a second of it
+        now = time.perf_counter()
+        self.pending_ticks = min(self.pending_ticks + (now - self.last_update) * self.logic_rate,
+                                 self.logic_rate)
+        self.last_update = now
+        game = self.game
+        while self.pending_ticks >= 1:
+            self.pending_ticks -= 1
+            if game.tetris.game_over:
+                self.new_game()
+                return
+            game.ticks += 1
+            game.apply_gravity()
+            game.update_speed()
+        self.board.draw(self.surface, [])
+
+    def draw(self, screen):
+        screen.blit(self.surface, (SCREEN_WIDTH // 2 - self.surface.get_width() // 2, 0))
+
+    def close(self):
+        self.bot.close()
+
+
 class Menu:
-    def __init__(self):
+    def __init__(self, history=None, attract_idle=ATTRACT_IDLE):
         self.selected_option = 0
         self.options = ["START GAME", "HIGH SCORES", "QUIT"]
         self.title_font = pygame.font.Font(None, 72)
@@ -309,6 +791,13 @@ class Menu:
         self.option_colors = [Colors.WHITE, Colors.WHITE, Colors.WHITE]
         self.show_high_scores = False
         self.high_score = HighScore()
+        # Optional scores.ScoreHistory; with it the high scores screen is a paged leaderboard
+        self.history = history
+        self.leaderboard = None
+        # Seconds without input before the attract mode game starts; None disables it
+        self.attract_idle = attract_idle
+        self.attract = None
+        self.last_input_time = time.time()
         self.animation_offset = 0
         self.last_animation_time = time.time()
 
@@ -375,6 +864,14 @@ class Menu:
         overlay.fill((0, 0, 0, 200))
         screen.blit(overlay, (0, 0))
 
+        if self.leaderboard is not None:
+            title = self.option_font.render("HIGH SCORES", True, Colors.YELLOW)
+            screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 110))
+            self.leaderboard.draw(screen, 150)
+            back_text = self.small_font.render("Press ESC to return", True, Colors.WHITE)
+            screen.blit(back_text, (SCREEN_WIDTH // 2 - back_text.get_width() // 2, 460))
+            return
+
         # High scores title
         title = self.option_font.render("HIGH SCORES", True, Colors.YELLOW)
         screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 150))
@@ -394,10 +891,25 @@ class Menu:
         back_text = self.small_font.render("Press ESC to return", True, Colors.WHITE)
         screen.blit(back_text, (SCREEN_WIDTH // 2 - back_text.get_width() // 2, 350))
 
+    def update_attract(self):
+        if self.attract is not None:
+            self.attract.update()
+        elif (self.attract_idle is not None and not self.show_high_scores
+                and time.time() - self.last_input_time > self.attract_idle):
+            self.attract = AttractMode()
+
+    def stop_attract(self):
+        if self.attract is not None:
+            self.attract.close()
+            self.attract = None
+
     def draw(self, screen):
         screen.fill(Colors.BLACK)
-        self.update_animation()
-        self.draw_background(screen)
+        if self.attract is not None:
+            self.attract.draw(screen)
+        else:
+            self.update_animation()
+            self.draw_background(screen)
         self.draw_title(screen)
 
         if not self.show_high_scores:
@@ -424,6 +936,11 @@ class Menu:
                 return "quit"
 
             if event.type == pygame.KEYDOWN:
+                self.last_input_time = time.time()
+                if self.attract is not None:
+                    # The first key only ends the attract mode
+                    self.stop_attract()
+                    continue
                 if not self.show_high_scores:
                     if event.key == pygame.K_DOWN:
                         self.selected_option = (self.selected_option + 1) % len(self.options)
@@ -434,42 +951,71 @@ class Menu:
                             return "start"
                         elif self.selected_option == 1:  # High Scores
                             self.show_high_scores = True
+                            if self.history is not None:
+                                self.leaderboard = Leaderboard(self.history.pages(), self.small_font)
                         elif self.selected_option == 2:  # Quit
                             return "quit"
                 else:
                     if event.key == pygame.K_ESCAPE:
                         self.show_high_scores = False
+                        self.leaderboard = None
+                    elif self.leaderboard is not None:
+                        self.leaderboard.handle_key(event.key)
 
         return "menu"
 
 
-def show_menu():
-    menu = Menu()
-    clock = pygame.time.Clock()
+async def show_menu(renderer, on_phase=None, history=None):
+    menu = Menu(history)
+    clock = FrameClock()
 
     while True:
+        if on_phase is not None:
+            on_phase(None, "menu")
         result = menu.handle_input()
         if result != "menu":
+            menu.stop_attract()
             return result
 
-        menu.draw(screen)
-        pygame.display.flip()
-        clock.tick(60)
+        menu.update_attract()
+        renderer.draw_menu(menu)
+        renderer.present()
+        await clock.tick(ATTRACT_FPS if menu.attract is not None else 60)
 
 
 class GameOverScreen:
-    def __init__(self, score, high_score):
+    def __init__(self, score, high_score, new_high_score=False):
+        # new_high_score comes from Game.play, which also saves it off the frame path
         self.score = score
         self.high_score = high_score
         self.title_font = pygame.font.Font(None, 60)
         self.option_font = pygame.font.Font(None, 30)
         self.small_font = pygame.font.Font(None, 24)
         self.selected_option = 0  # 0 for view high scores, 1 for restart
-        current_high_score = high_score.save_high_score(score)
-        self.new_high_score = score >= current_high_score
+        self.new_high_score = new_high_score
         self.animation_offset = 0
         self.last_animation_time = time.time()
         self.options = ["VIEW HIGH SCORES", "PLAY AGAIN", "MAIN MENU"]
+        # Black semi-transparent background for each option
+        self.option_bg = pygame.Surface((220, 50), pygame.SRCALPHA)
+        self.option_bg.fill((0, 0, 0, 180))
+        # The screen's texts are fixed, so they are rendered once: each option in both colors
+        self.option_texts = [
+            {color: self.option_font.render(option, True, color) for color in (Colors.WHITE, Colors.YELLOW)}
+            for option in self.options
+        ]
+        self.title = self.title_font.render("GAME OVER", True, Colors.RED)
+        self.score_text = self.option_font.render(f"YOUR SCORE: {self.score}", True, Colors.WHITE)
+        self.new_high_text = self.small_font.render("!!! NEW HIGH SCORE !!!", True, Colors.YELLOW)
+        controls = [
+            "CONTROLS:",
+            "Key_UP, Key_DOWN - Navigate",
+            "Key_LEFT, Key_RIGHT - Move",
+            "ENTER - Select",
+            "ESC - Back"
+        ]
+        self.controls = [self.small_font.render(line, True, Colors.CYAN if i == 0 else Colors.WHITE)
+                         for i, line in enumerate(controls)]
 
     def update_animation(self):
         current_time = time.time()
@@ -479,7 +1025,7 @@ class GameOverScreen:
 
     def draw_title(self, screen):
         # Main title
-        title = self.title_font.render("GAME OVER", True, Colors.RED)
+        title = self.title
         screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 30))
 
         # Decorative lines
@@ -492,21 +1038,18 @@ class GameOverScreen:
 
     def draw_score_info(self, screen):
         # Score display
-        score_text = self.option_font.render(f"YOUR SCORE: {self.score}", True, Colors.WHITE)
+        score_text = self.score_text
         screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, 120))
 
         # High score indication if applicable
         if self.new_high_score:
-            new_high_text = self.small_font.render("!!! NEW HIGH SCORE !!!", True, Colors.YELLOW)
+            new_high_text = self.new_high_text
             screen.blit(new_high_text, (SCREEN_WIDTH // 2 - new_high_text.get_width() // 2, 170))
 
     def draw_options(self, screen):
         # Draw black background boxes for each option first
         for i, option in enumerate(self.options):
-            # Black semi-transparent background for each option
-            option_bg = pygame.Surface((220, 50), pygame.SRCALPHA)
-            option_bg.fill((0, 0, 0, 180))  # Semi-transparent black
-            screen.blit(option_bg, (SCREEN_WIDTH // 2 - 110, 220 + i * 60))
+            screen.blit(self.option_bg, (SCREEN_WIDTH // 2 - 110, 220 + i * 60))
 
             if i == self.selected_option:
                 # Selected option effect - yellow border
@@ -518,28 +1061,18 @@ class GameOverScreen:
 
             # Draw the option text
             text_color = Colors.YELLOW if i == self.selected_option else Colors.WHITE
-            text = self.option_font.render(option, True, text_color)
+            text = self.option_texts[i][text_color]
             screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, 225 + i * 60))
 
     def draw(self, screen):
-        # Keep the game board visible in the background
-        screen.fill(Colors.BLACK)
+        # The renderer has already put the dimmed game board in the background
         self.update_animation()
         self.draw_title(screen)
         self.draw_score_info(screen)
         self.draw_options(screen)
 
         # Draw instructions
-        controls = [
-            "CONTROLS:",
-            "Key_UP, Key_DOWN - Navigate",
-            "Key_LEFT, Key_RIGHT - Move",
-            "ENTER - Select",
-            "ESC - Back"
-        ]
-        for i, line in enumerate(controls):
-            color = Colors.CYAN if i == 0 else Colors.WHITE
-            text = self.small_font.render(line, True, color)
+        for i, text in enumerate(self.controls):
             screen.blit(text, (20, SCREEN_HEIGHT - 100 + i * 20))
 
     def handle_input(self):
@@ -563,123 +1096,383 @@ class GameOverScreen:
         return "game_over"
 
 
-class Game:
+class PygameRenderer:
+    # Draws the game into a pygame Surface; without one it opens the display window.
+    # Game, show_menu and the overlays only talk to a renderer, so any class with the
+    # same methods can replace it.
+    interactive = True  # Shows frames to a player and delivers keyboard events
+
+    def __init__(self, surface=None):
+        if surface is None:
+            surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption('Petris')
+        self.screen = surface
+        # Dimmed picture of the final board of backdrop_game, drawn under the overlays
+        self.backdrop = None
+        self.backdrop_game = None
+
+    def events(self):
+        return pygame.event.get()
+
+    def draw_board(self, game):
+        field = game.game_field
+        size = fit_block_size(field)
+        self.screen.fill(Colors.BLACK)
+        draw_grid(self.screen, field.columns, field.rows, size)
+        field.draw(self.screen, size)
+        game.tetris.draw(self.screen, size)
+
+    def draw_game(self, game):
+        screen = self.screen
+        screen.fill(Colors.BLACK)
+
+        # Draw game area with a border, blocks scaled to fit the board size
+        field = game.game_field
+        size = fit_block_size(field)
+        pygame.draw.rect(screen, Colors.LIGHT_GRAY, (0, 0, field.columns * size, field.rows * size), 1)
+        draw_grid(screen, field.columns, field.rows, size)
+        field.draw(screen, size)
+        game.tetris.draw(screen, size)
+
+        # Draw side panel
+        pygame.draw.rect(screen, Colors.DARK_GRAY, (GAME_WIDTH, 0, SCREEN_WIDTH - GAME_WIDTH, SCREEN_HEIGHT))
+
+        # Draw game info
+        game.tetris.draw_next_piece(screen)
+        game.score.draw(screen)
+        game.high_score.draw(screen)
+
+    def draw_overlay(self, game, overlay):
+        # Game over and score screens on top of the board. The board no longer changes
+        # once the game is over, so it is drawn and dimmed once and then reused.
+        if self.backdrop_game is not game:
+            self.draw_board(game)
+            self.backdrop = self.screen.copy()
+            self.backdrop.fill((55, 55, 55), special_flags=pygame.BLEND_MULT)  # Black at alpha 200
+            self.backdrop_game = game
+        self.screen.blit(self.backdrop, (0, 0))
+        overlay.draw(self.screen)
+
+    def draw_menu(self, menu):
+        menu.draw(self.screen)
+
+    def present(self):
+        pygame.display.flip()
+
+
+class OffscreenRenderer(PygameRenderer):
+    # Renders into an in-memory Surface with no window (screenshots, frame export, CI)
+    interactive = False
+
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        super().__init__(pygame.Surface((width, height)))
+        self.frames = 0
+
+    def events(self):
+        return []
+
+    def present(self):
+        self.frames += 1
+
+
+class NullRenderer:
+    # Draws nothing: Game.run with it measures the game logic alone
+    interactive = False
+
     def __init__(self):
-        self.game_field = GameField()
+        self.frames = 0
+
+    def events(self):
+        return []
+
+    def draw_board(self, game):
+        pass
+
+    def draw_game(self, game):
+        pass
+
+    def draw_overlay(self, game, overlay):
+        pass
+
+    def draw_menu(self, menu):
+        pass
+
+    def present(self):
+        self.frames += 1
+
+
+def restrict_events():
+    # Only keyboard and quit events reach the queue; mouse motion, window and joystick
+    # events are dropped by SDL instead of being converted and polled every frame
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP])
+
+
+class InputHandler:
+    # Keyboard handling for Game with delayed auto-shift: holding left/right moves once,
+    # waits das seconds, then repeats every arr seconds (arr=0 slides to the wall).
+    # Holding down soft-drops every soft_drop seconds. Repeats are scheduled on the
+    # perf_counter clock, so they do not depend on the frame rate.
+    #
+    # Every action keeps the time of the input that caused it; presented() turns those
+    # into input-to-present latencies once the frame showing them has been flipped.
+    REPEATING = {pygame.K_LEFT: "move_left", pygame.K_RIGHT: "move_right", pygame.K_DOWN: "move_down"}
+    SINGLE = {pygame.K_UP: "rotate_piece", pygame.K_SPACE: "drop"}
+
+    def __init__(self, das=0.167, arr=0.033, soft_drop=0.05, clock=time.perf_counter, samples=10000):
+        self.das = das
+        self.arr = arr
+        self.soft_drop = soft_drop
+        self.clock = clock
+        self.repeat_at = {}  # Held key -> time of its next repeat
+        self.shift_key = None  # The horizontal key that repeats (last pressed wins)
+        self.pending = []  # Input times of actions not yet presented
+        self.latencies = deque(maxlen=samples)
+
+    def handle(self, event, tetris, now=None):
+        if now is None:
+            now = self.clock()
+        if event.type == pygame.KEYDOWN:
+            key = event.key
+            if key in self.SINGLE:
+                self.apply(tetris, self.SINGLE[key], now)
+            elif key in self.REPEATING:
+                self.apply(tetris, self.REPEATING[key], now)
+                if key == pygame.K_DOWN:
+                    self.repeat_at[key] = now + self.soft_drop
+                else:
+                    self.repeat_at[key] = now + self.das
+                    self.shift_key = key
+        elif event.type == pygame.KEYUP and event.key in self.repeat_at:
+            del self.repeat_at[event.key]
+            if event.key == self.shift_key:
+                # Fall back to the other direction if it is still held, with a fresh delay
+                self.shift_key = None
+                for key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    if key in self.repeat_at:
+                        self.shift_key = key
+                        self.repeat_at[key] = now + self.das
+
+    def update(self, tetris, now=None):
+        # Run the repeats that came due since the last frame, stamped with their due time
+        if not self.repeat_at:
+            return
+        if now is None:
+            now = self.clock()
+        for key, due in list(self.repeat_at.items()):
+            if key != pygame.K_DOWN and key != self.shift_key:
+                continue
+            name = self.REPEATING[key]
+            if key != pygame.K_DOWN and self.arr <= 0:
+                # Instant repeat: slide until the piece stops
+                if due <= now:
+                    for _ in range(tetris.game_field.columns):
+                        x = tetris.x
+                        getattr(tetris, name)()
+                        if tetris.x == x:
+                            break
+                        self.pending.append(due)
+                    self.repeat_at[key] = now
+                continue
+            interval = self.soft_drop if key == pygame.K_DOWN else self.arr
+            while due <= now and not tetris.game_over:
+                position = (tetris.x, tetris.y)
+                getattr(tetris, name)()
+                if (tetris.x, tetris.y) != position:
+                    self.pending.append(due)  # Repeats against a wall are not inputs
+                due += interval
+            self.repeat_at[key] = due
+
+    def apply(self, tetris, name, time_stamp):
+        getattr(tetris, name)()
+        self.pending.append(time_stamp)
+
+    def presented(self, now=None):
+        # Call right after the frame was shown
+        if not self.pending:
+            return
+        if now is None:
+            now = self.clock()
+        for time_stamp in self.pending:
+            self.latencies.append(now - time_stamp)
+        self.pending.clear()
+
+    def latency_stats(self):
+        # Input-to-present latency percentiles in milliseconds
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        last = len(ordered) - 1
+        return {
+            "inputs": len(ordered),
+            "p50": ordered[last // 2] * 1000,
+            "p95": ordered[last * 95 // 100] * 1000,
+            "p99": ordered[last * 99 // 100] * 1000,
+            "max": ordered[last] * 1000,
+        }
+
+
+class Game(Hooks):
+    # on_speed_change(game, speed_level), on_game_over(game),
+    # on_phase(game, phase) at the start of each part of a frame: "wait", "gravity",
+    # "input", "draw", "present" while playing, "game_over" and "high_scores" per frame
+    # of those screens
+    HOOKS = ("on_speed_change", "on_game_over", "on_phase")
+    on_speed_change = None
+    on_game_over = None
+    on_phase = None
+
+    def __init__(self, autoplay=None, move_budget=0.008, telemetry=None, seed=None,
+                 renderer=None, framerate=None, columns=COLUMNS, rows=ROWS, history=None, player="player"):
+        self.game_field = GameField(columns, rows)
         self.score = Score()
         self.high_score = HighScore()
-        self.tetris = Tetris(self.game_field, self.score)
-        self.clock = pygame.time.Clock()
-        self.base_speed = 0.5  # Initial delay in seconds between automatic drops
-        self.current_speed = self.base_speed
-        self.last_drop_time = time.time()
-        self.speed_increase_thresholds = [1000, 3000]  # Initial thresholds
-        self.next_threshold_index = 0
+        # With a seed the piece sequence, and with it the whole game given the same inputs
+        # per tick, is reproducible
+        self.seed = seed
+        self.tetris = Tetris(self.game_field, self.score, random.Random(seed) if seed is not None else random)
+        self.clock = FrameClock()
+        self.gravity_table = GRAVITY_TABLE
+        self.speed_level = 0
+        self.gravity = self.gravity_table[0]  # Cells per tick, fixed point
+        self.gravity_accumulator = 0
+        # Optional bot that places a piece on every gravity tick, given move_budget seconds to think
+        self.autoplay = autoplay
+        self.move_budget = move_budget
+        self.ticks = 0
+        # NullRenderer by default; without a player watching, frames run as fast as possible
+        self.renderer = renderer if renderer is not None else NullRenderer()
+        if framerate is None:
+            framerate = FPS if self.renderer.interactive else 0
+        self.framerate = framerate
+        self.input_handler = InputHandler()
+        # Optional telemetry.Telemetry, subscribed to the game hooks
+        if telemetry is not None:
+            telemetry.attach(self)
+        # Optional scores.ScoreHistory, records the game when it ends
+        self.history = history
+        if history is not None:
+            history.attach(self, player)
 
     def update_speed(self):
-        # Update game speed based on score thresholds
-        if self.next_threshold_index < len(self.speed_increase_thresholds):
-            next_threshold = self.speed_increase_thresholds[self.next_threshold_index]
-            if self.score.score >= next_threshold:
-                # Increase speed by reducing the delay (minimum of 0.1 seconds)
-                self.current_speed = max(0.1, self.current_speed * 0.7)  # 30% faster each time
-                self.next_threshold_index += 1
-
-                # Calculate next threshold (1000, 3000, 6000, 10000, 15000, etc.)
-                if self.next_threshold_index >= len(self.speed_increase_thresholds):
-                    last_threshold = self.speed_increase_thresholds[-1]
-                    increment = 2000 + (self.next_threshold_index - 2) * 1000
-                    next_threshold = last_threshold + increment
-                    self.speed_increase_thresholds.append(next_threshold)
+        # Look up gravity for the speed level reached by the current score
+        level = speed_level(self.score.score)
+        if level != self.speed_level:
+            self.speed_level = level
+            self.gravity = self.gravity_table[min(level, len(self.gravity_table) - 1)]
+            if self.on_speed_change is not None:
+                self.on_speed_change(self, level)
+
+    def apply_gravity(self):
+        # Advance one tick of gravity; returns the number of whole rows that fell
+        if self.gravity >= MAX_GRAVITY:
+            # The piece lands on the tick it spawns, however tall the field
+            rows = self.game_field.rows
+        else:
+            self.gravity_accumulator += self.gravity
+            rows = self.gravity_accumulator >> GRAVITY_SHIFT
+            self.gravity_accumulator &= GRAVITY_ONE - 1
+        if rows:
+            if self.autoplay is not None:
+                self.autoplay.play(self.tetris, self.move_budget)
+            else:
+                self.tetris.fall(rows)
+        return rows
 
     def run(self):
+        # Blocking entry point for callers outside an event loop
+        return asyncio.run(self.play())
+
+    async def play(self):
         while not self.tetris.game_over:
-            current_time = time.time()
-            self.clock.tick(60)  # Keep a consistent frame rate
+            if self.on_phase is not None:
+                self.on_phase(self, "wait")
+            await self.clock.tick(self.framerate)  # Keep a consistent frame rate
+            self.ticks += 1
 
-            # Handle automatic dropping based on current speed
-            if current_time - self.last_drop_time > self.current_speed:
-                self.tetris.move_down()
-                self.last_drop_time = current_time
+            # Handle automatic dropping, one gravity step per frame
+            if self.on_phase is not None:
+                self.on_phase(self, "gravity")
+            self.apply_gravity()
 
             self.update_speed()  # Check if we need to increase speed
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.tetris.game_over = True
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_LEFT:
-                        self.tetris.move_left()
-                    if event.key == pygame.K_RIGHT:
-                        self.tetris.move_right()
-                    if event.key == pygame.K_DOWN:
-                        self.tetris.move_down()
-                    if event.key == pygame.K_UP:
-                        self.tetris.rotate_piece()
-                    if event.key == pygame.K_SPACE:
-                        self.tetris.drop()
+            if self.on_phase is not None:
+                self.on_phase(self, "input")
+            events = self.renderer.events()
+            if events:
+                now = self.input_handler.clock()
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        self.tetris.game_over = True
+                    else:
+                        self.input_handler.handle(event, self.tetris, now)
+            self.input_handler.update(self.tetris)
 
             # Draw everything
-            screen.fill(Colors.BLACK)
-
-            # Draw game area with a border
-            pygame.draw.rect(screen, Colors.LIGHT_GRAY, (0, 0, GAME_WIDTH, GAME_HEIGHT), 1)
-            draw_grid()
-            self.game_field.draw()
-            self.tetris.draw()
-
-            # Draw side panel
-            pygame.draw.rect(screen, Colors.DARK_GRAY, (GAME_WIDTH, 0, SCREEN_WIDTH - GAME_WIDTH, SCREEN_HEIGHT))
-
-            # Draw game info
-            self.tetris.draw_next_piece()
-            self.score.draw()
-            self.high_score.draw()
-
-            pygame.display.flip()
-
-        # Save high score and show game over screen
-        self.high_score.save_high_score(self.score.score)
-        game_over_screen = GameOverScreen(self.score.score, self.high_score)
+            if self.on_phase is not None:
+                self.on_phase(self, "draw")
+            self.renderer.draw_game(self)
+            if self.on_phase is not None:
+                self.on_phase(self, "present")
+            self.renderer.present()
+            self.input_handler.presented()
+
+        if self.on_game_over is not None:
+            self.on_game_over(self)
+
+        # Only a person playing sets the high score: headless games (replays, exports,
+        # the perf gate) and autoplay leave highscore.txt alone
+        if not self.renderer.interactive:
+            return "game_over"
+        # Save high score in the background and show game over screen
+        new_high_score = self.autoplay is None and self.high_score.update(self.score.score)
+        if new_high_score:
+            run_in_background(asyncio.to_thread(self.high_score.write))
+        game_over_screen = GameOverScreen(self.score.score, self.high_score, new_high_score)
 
         while True:
+            if self.on_phase is not None:
+                self.on_phase(self, "game_over")
             action = game_over_screen.handle_input()
 
             if action == "quit":
-                pygame.quit()
-                sys.exit()
+                return "quit"
             elif action == "view_scores":
-                self.show_high_scores()
+                if await self.show_high_scores() == "quit":
+                    return "quit"
             elif action == "restart":
                 return "restart"
             elif action == "menu":
                 return "menu"
 
-            screen.fill(Colors.BLACK)
-            # Redraw the game board in the background
-            draw_grid()
-            self.game_field.draw()
-            self.tetris.draw()
-            # Then draw the game over screen
-            game_over_screen.draw(screen)
-            pygame.display.flip()
-            self.clock.tick(60)
-
-    def show_high_scores(self):
+            # Redraw the game board in the background, then the game over screen
+            self.renderer.draw_overlay(self, game_over_screen)
+            self.renderer.present()
+            await self.clock.tick(60)
+
+    async def show_high_scores(self):
         # Create a high score display screen matching the menu style
-        clock = pygame.time.Clock()
+        clock = FrameClock()
         showing_scores = True
 
         # Create a temporary menu-like object for consistent styling
         class TempMenu:
-            def __init__(self, high_score, current_score):
+            def __init__(self, high_score, current_score, pages=None):
                 self.high_score = high_score
                 self.current_score = current_score
+                self.score_bg = pygame.Surface((250, 120), pygame.SRCALPHA)
+                self.score_bg.fill((0, 0, 0, 180))
                 self.title_font = pygame.font.Font(None, 60)
                 self.score_font = pygame.font.Font(None, 36)
                 self.small_font = pygame.font.Font(None, 24)
+                self.leaderboard = Leaderboard(pages, self.small_font) if pages is not None else None
                 self.animation_offset = 0
                 self.last_animation_time = time.time()
+                # The texts do not change while the screen is open
+                self.current_text = self.score_font.render(f"Your Score: {current_score}", True, Colors.WHITE)
+                self.high_text = self.score_font.render(f"High Score: {high_score}", True, Colors.CYAN)
+                self.instructions = self.small_font.render("Press ENTER or ESC to continue", True, Colors.WHITE)
 
             def update_animation(self):
                 current_time = time.time()
@@ -707,69 +1500,131 @@ class Game:
             def draw(self, screen):
                 self.update_animation()
 
-                # Dark semi-transparent background
-                overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-                overlay.fill((0, 0, 0, 200))
-                screen.blit(overlay, (0, 0))
-
+                # Drawn over the renderer's dimmed backdrop of the final board
                 self.draw_background(screen)
 
+                current_text = self.current_text
+                instructions = self.instructions
+                if self.leaderboard is not None:
+                    screen.blit(current_text, (SCREEN_WIDTH // 2 - current_text.get_width() // 2, 110))
+                    self.leaderboard.draw(screen, 150)
+                    screen.blit(instructions, (SCREEN_WIDTH // 2 - instructions.get_width() // 2, 460))
+                    return
+
                 # Score display box
-                score_bg = pygame.Surface((250, 120), pygame.SRCALPHA)
-                score_bg.fill((0, 0, 0, 180))
-                screen.blit(score_bg, (SCREEN_WIDTH // 2 - 125, 150))
+                screen.blit(self.score_bg, (SCREEN_WIDTH // 2 - 125, 150))
 
                 # Current score
-                current_text = self.score_font.render(f"Your Score: {self.current_score}", True, Colors.WHITE)
                 screen.blit(current_text, (SCREEN_WIDTH // 2 - current_text.get_width() // 2, 170))
 
                 # High score
-                high_text = self.score_font.render(f"High Score: {self.high_score}", True, Colors.CYAN)
-                screen.blit(high_text, (SCREEN_WIDTH // 2 - high_text.get_width() // 2, 220))
+                screen.blit(self.high_text, (SCREEN_WIDTH // 2 - self.high_text.get_width() // 2, 220))
 
                 # Instructions
-                instructions = self.small_font.render("Press ENTER or ESC to continue", True, Colors.WHITE)
                 screen.blit(instructions, (SCREEN_WIDTH // 2 - instructions.get_width() // 2, 350))
 
-        temp_menu = TempMenu(self.high_score.high_score, self.score.score)
+        pages = None
+        if self.history is not None:
+            # Wait for this game's row to be committed so it shows up in the list
+            await asyncio.to_thread(self.history.flush)
+            pages = self.history.pages()
+        temp_menu = TempMenu(self.high_score.high_score, self.score.score, pages)
 
         while showing_scores:
-            for event in pygame.event.get():
+            if self.on_phase is not None:
+                self.on_phase(self, "high_scores")
+            for event in self.renderer.events():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
+                    return "quit"
                 if event.type == pygame.KEYDOWN:
                     if event.key in (pygame.K_RETURN, pygame.K_ESCAPE):
                         showing_scores = False
-
-            # Redraw the game board in the background
-            screen.fill(Colors.BLACK)
-            draw_grid()
-            self.game_field.draw()
-            self.tetris.draw()
-
-            # Draw the high scores overlay
-            temp_menu.draw(screen)
-
-            pygame.display.flip()
-            clock.tick(60)
-
-
-def main():
-    pygame.display.set_caption('Petris')
-
-    while True:
-        menu_result = show_menu()
-
-        if menu_result == "start":
-            while True:
-                game_instance = Game()
-                result = game_instance.run()
-                if result == "menu":
+                    elif temp_menu.leaderboard is not None:
+                        temp_menu.leaderboard.handle_key(event.key)
+
+            # Redraw the game board in the background, then the high scores overlay
+            self.renderer.draw_overlay(self, temp_menu)
+            self.renderer.present()
+            await clock.tick(60)
+
+
+async def run_app(args):
+    renderer = PygameRenderer()
+    restrict_events()
+
+    if args.export:
+        # Record what the window shows, e.g. --export clip.gif. The file is finished at exit.
+        from export import ExportRenderer, open_sink
+        renderer = ExportRenderer(renderer, open_sink(args.export))
+        atexit.register(renderer.close)
+
+    autoplay = None
+    if args.autoplay:
+        from bot import ExpectimaxBot
+        autoplay = ExpectimaxBot()
+
+    telemetry = None
+    if args.telemetry:
+        from telemetry import Telemetry
+        telemetry = Telemetry("telemetry.jsonl")
+        run_in_background(telemetry.writer_task())
+
+    # Every finished game goes into the score history
+    from scores import ScoreHistory
+    history = ScoreHistory("scores.db")
+    atexit.register(history.close)
+
+    on_phase = None
+    if args.memprofile:
+        # Allocation report per screen and frame phase, printed and saved at exit
+        from memprofile import MemoryProfiler
+        profiler = MemoryProfiler(output="memprofile.json")
+        on_phase = profiler.on_phase
+        atexit.register(profiler.report)
+
+    # Closing the window from any screen ends up here, so buffered telemetry and the
+    # bot's worker pool are always shut down
+    try:
+        while True:
+            menu_result = await show_menu(renderer, on_phase, history)
+
+            if menu_result == "start":
+                result = "restart"
+                while result == "restart":
+                    # A fresh seed per game, stored with its score so the game can be reproduced
+                    game_instance = Game(autoplay, telemetry=telemetry, seed=random.getrandbits(32),
+                                         renderer=renderer, columns=args.columns, rows=args.rows,
+                                         history=history, player=args.player)
+                    if on_phase is not None:
+                        game_instance.add_hook("on_phase", on_phase)
+                    result = await game_instance.play()
+                    if args.latency:
+                        print(f"input latency: {game_instance.input_handler.latency_stats()}", file=sys.stderr)
+                if result == "quit":
                     break
-                # If "restart", the loop will continue and create a new game
-        elif menu_result == "quit":
-            pygame.quit()
-            sys.exit()
-
-main()
\ No newline at end of file
+            elif menu_result == "quit":
+                break
+    finally:
+        if autoplay is not None:
+            autoplay.close()
+        if telemetry is not None:
+            await telemetry.close_async()
+        pygame.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play Petris")
+    parser.add_argument("--autoplay", action="store_true", help="let the bot play")
+    parser.add_argument("--columns", type=int, default=COLUMNS, help="board width, e.g. 64 for big mode")
+    parser.add_argument("--rows", type=int, default=ROWS, help="board height, e.g. 400 for big mode")
+    parser.add_argument("--player", default="player", help="name stored with each score")
+    parser.add_argument("--export", help="record the window to a .gif, numbered .png files or raw RGB frames (- for stdout)")
+    parser.add_argument("--telemetry", action="store_true", help="write frame and input events to telemetry.jsonl")
+    parser.add_argument("--memprofile", action="store_true", help="report allocations per phase at exit")
+    parser.add_argument("--latency", action="store_true", help="print input latency after each game")
+    args = parser.parse_args(argv)
+    asyncio.run(run_app(args))
+
+
+if __name__ == "__main__":
+    main()
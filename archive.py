@@ -0,0 +1,280 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from replay import INPUT_METHODS, Replay, ReplayPlayer, load_replays
+
+# Replay archive: many games in one append-only data file plus a fixed-width index,
+# both memory-mapped, so a query or a replay only touches the pages it reads.
+#
+#   python archive.py add games replays.jsonl           append replays to games.data/games.index
+#   python archive.py query games --min-score 50000     list matching games from the index
+#   python archive.py get games 123456 > replay.jsonl   one game back as a replay line
+#
+# The data file holds the inputs of each game packed two per byte. Every index record
+# is INDEX.size bytes, so game n is at byte n * INDEX.size of the index. The data of a
+# game is flushed to the OS before its index record is written, so a crashed process
+# leaves at worst unreferenced bytes at the end of the data file and a torn last index
+# record, both of which the next writer truncates away. That ordering only
+# survives a system crash or power loss with durable=True, which fsyncs the data first.
+
+INDEX = struct.Struct("<QIIIqd")  # offset, length, score, lines, seed, timestamp
+NO_SEED = -1
+
+IndexRecord = namedtuple("IndexRecord", "number offset length score lines seed timestamp")
+
+# One input per nibble; 0 pads the last byte. A drop almost always ends the move, so
+# that case is one nibble and the rare others get their own codes.
+NIBBLES = {"L": 1, "R": 2, "C": 3, "D": 4}
+DROP_END = 5  # Drop, end of the move
+DROP = 6  # Drop with more inputs after it in the same move
+END = 7  # End of a move that has no drop
+CODES = {nibble: code for code, nibble in NIBBLES.items()}
+CODES[DROP] = "H"
+BYTE_NIBBLES = [(byte >> 4, byte & 0x0F) for byte in range(256)]
+
+
+move_nibbles = {}  # Games reuse a few hundred distinct moves
+
+
+def encode_move(move):
+    nibbles = []
+    for i, code in enumerate(move):
+        if code != "H":
+            nibbles.append(NIBBLES[code])
+        elif i == len(move) - 1:
+            nibbles.append(DROP_END)
+        else:
+            nibbles.append(DROP)
+    if not move.endswith("H"):
+        nibbles.append(END)
+    return nibbles
+
+
+def encode_moves(moves):
+    nibbles = []
+    for move in moves:
+        encoded = move_nibbles.get(move)
+        if encoded is None:
+            encoded = move_nibbles[move] = encode_move(move)
+        nibbles += encoded
+    if len(nibbles) % 2:
+        nibbles.append(0)
+    return bytes(nibbles[i] << 4 | nibbles[i + 1] for i in range(0, len(nibbles), 2))
+
+
+def iter_moves(data):
+    # Yields the move strings of a game from its packed bytes (any buffer)
+    move = []
+    for byte in data:
+        for nibble in BYTE_NIBBLES[byte]:
+            if nibble == DROP_END:
+                move.append("H")
+                yield "".join(move)
+                move = []
+            elif nibble == END:
+                yield "".join(move)
+                move = []
+            elif nibble:
+                move.append(CODES[nibble])
+
+
+class ArchivePlayer(ReplayPlayer):
+    # Plays a game straight from the mapped archive bytes, decoding one move per call
+    def __init__(self, data):
+        super().__init__(None)
+        self.moves = iter_moves(data)
+        self.next_move = next(self.moves, None)
+
+    def finished(self):
+        return self.next_move is None
+
+    def play(self, tetris, budget=0):
+        if self.finished():
+            tetris.game_over = True
+            return
+        for code in self.next_move:
+            getattr(tetris, INPUT_METHODS[code])()
+        self.index += 1
+        self.next_move = next(self.moves, None)
+
+
+class ReplayArchive:
+    def __init__(self, path, writable=True, durable=False):
+        # A read-only archive must exist; it raises FileNotFoundError otherwise
+        self.data_path = path + ".data"
+        self.index_path = path + ".index"
+        self.writable = writable
+        self.durable = durable
+        self.data = None
+        self.index = None
+        if writable:
+            self.data = open(self.data_path, "ab")
+            self.index = open(self.index_path, "ab")
+        self.data_map = None
+        self.index_map = None
+        self.mapped_count = -1
+        self.count = os.path.getsize(self.index_path) // INDEX.size
+        self.end = os.path.getsize(self.data_path)
+        if writable:
+            self.recover()
+
+    def recover(self):
+        # Cuts off what a crash left behind: a torn index record, which would misalign
+        # every record appended after it, and data that no index record points to
+        self.index.truncate(self.count * INDEX.size)
+        end = 0
+        if self.count:
+            with open(self.index_path, "rb") as f:
+                f.seek((self.count - 1) * INDEX.size)
+                offset, length = INDEX.unpack(f.read(INDEX.size))[:2]
+            end = offset + length
+        if end < self.end:
+            self.data.truncate(end)
+            self.end = end
+
+    def __len__(self):
+        return self.count
+
+    def append(self, replay, timestamp=None):
+        # Returns the number of the game in the archive
+        if not self.writable:
+            raise ValueError(f"{self.data_path} is open read-only")
+        data = encode_moves(replay.moves)
+        seed = replay.seed if replay.seed is not None else NO_SEED
+        if timestamp is None:
+            timestamp = time.time()
+        self.data.write(data)
+        self.data.flush()
+        if self.durable:
+            os.fsync(self.data.fileno())
+        self.index.write(INDEX.pack(self.end, len(data), replay.score, replay.lines, seed, timestamp))
+        self.end += len(data)
+        self.count += 1
+        return self.count - 1
+
+    def flush(self):
+        if self.writable:
+            self.data.flush()
+            self.index.flush()
+
+    def mapped(self):
+        # Maps both files again when games were appended since the last read. The old
+        # maps are not closed: players and views may still point into them.
+        if self.mapped_count != self.count:
+            self.flush()
+            self.data_map = self.map(self.data_path)
+            self.index_map = self.map(self.index_path)
+            self.mapped_count = self.count
+        return self.data_map, self.index_map
+
+    @staticmethod
+    def map(path):
+        # The map stays valid after the file is closed
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"")  # mmap cannot map an empty file
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def record(self, number):
+        if not 0 <= number < self.count:
+            raise IndexError(f"No game {number} in {self.index_path}")
+        index_map = self.mapped()[1]
+        return IndexRecord(number, *INDEX.unpack_from(index_map, number * INDEX.size))
+
+    def records(self, min_score=None, max_score=None, seed=None, since=None, until=None):
+        # Scans the index in place; yields the matching records in archive order
+        index_map = self.mapped()[1][:self.count * INDEX.size]
+        for number, fields in enumerate(INDEX.iter_unpack(index_map)):
+            offset, length, score, lines, game_seed, timestamp = fields
+            if min_score is not None and score < min_score:
+                continue
+            if max_score is not None and score > max_score:
+                continue
+            if seed is not None and game_seed != seed:
+                continue
+            if since is not None and timestamp < since:
+                continue
+            if until is not None and timestamp >= until:
+                continue
+            yield IndexRecord(number, *fields)
+
+    def moves(self, number):
+        # The packed inputs of a game, a view into the mapped data file
+        record = self.record(number)
+        return self.mapped()[0][record.offset:record.offset + record.length]
+
+    def player(self, number):
+        return ArchivePlayer(self.moves(number))
+
+    def replay(self, number):
+        record = self.record(number)
+        seed = record.seed if record.seed != NO_SEED else None
+        return Replay(seed, list(iter_moves(self.moves(number))), record.score, record.lines)
+
+    def close(self):
+        if self.writable:
+            self.data.close()
+            self.index.close()
+        self.data_map = self.index_map = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append to and search a memory-mapped replay archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="append the games of replay JSONL files")
+    add.add_argument("archive", help="archive path without the .data/.index extension")
+    add.add_argument("replays", nargs="+")
+    query = commands.add_parser("query", help="list games from the index")
+    query.add_argument("archive")
+    query.add_argument("--min-score", type=int)
+    query.add_argument("--max-score", type=int)
+    query.add_argument("--seed", type=int)
+    query.add_argument("--since", type=float, help="unix time")
+    query.add_argument("--until", type=float, help="unix time")
+    query.add_argument("--limit", type=int, default=20, help="0 for no limit")
+    query.add_argument("--count", action="store_true", help="only print the number of matches")
+    get = commands.add_parser("get", help="print games as replay JSONL lines")
+    get.add_argument("archive")
+    get.add_argument("numbers", type=int, nargs="+")
+    args = parser.parse_args(argv)
+
+    try:
+        archive = ReplayArchive(args.archive, writable=args.command == "add")
+    except FileNotFoundError:
+        print(f"No archive at {args.archive} (.data/.index)", file=sys.stderr)
+        return 1
+    try:
+        if args.command == "add":
+            first = len(archive)
+            for path in args.replays:
+                for replay in load_replays(path):
+                    archive.append(replay)
+            archive.flush()
+            print(f"Added games {first} to {len(archive) - 1}", file=sys.stderr)
+        elif args.command == "query":
+            matches = archive.records(args.min_score, args.max_score, args.seed, args.since, args.until)
+            if args.count:
+                print(sum(1 for _ in matches))
+                return 0
+            for shown, record in enumerate(matches):
+                if args.limit and shown == args.limit:
+                    break
+                played = time.strftime("%Y-%m-%d %H:%M", time.localtime(record.timestamp))
+                print(f"#{record.number:<9} score={record.score:<8} lines={record.lines:<6} "
+                      f"seed={record.seed:<8} {played}  {record.length} bytes")
+        elif args.command == "get":
+            for number in args.numbers:
+                print(json.dumps(archive.replay(number).to_dict()))
+    finally:
+        archive.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import argparse
+import csv
+import json
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bot
+from Petris_1 import GameField, Score, Tetris
+from replay import Replay, ReplayPlayer, load_replays, save_replays
+
+# Headless batch runner: plays seeded games with a bot (or replays recorded games)
+# without a window and reports throughput and score statistics.
+#
+#   python batch.py --games 200 --bot greedy --workers 4 --output results.csv
+
+BOTS = ["greedy", "expectimax", "reachable", "random"]
+
+
+def make_bot(name, timed=True):
+    if name == "greedy":
+        return bot.ExpectimaxBot(depth=1)
+    if name == "expectimax":
+        # Untimed, every move searches to the full depth: 2 takes about 0.1 s a move, 3 about 10 s
+        return bot.ExpectimaxBot(depth=3 if timed else 2)
+    if name == "reachable":
+        return bot.ExpectimaxBot(depth=1, reachable=True)
+    if name == "random":
+        return RandomBot()
+    raise ValueError(f"Unknown bot: {name}")
+
+
+class RandomBot:
+    # Baseline: a random drop placement
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def choose(self, field, shape, next_shape=None, budget=0):
+        placements = bot.drop_placements(field, shape)
+        if not placements:
+            return None
+        return self.rng.choice(placements)[4]
+
+
+def play_game(seed, player, budget=0.01, max_pieces=None, record=False):
+    # Play one headless game. player is either a bot with choose() or a ReplayPlayer.
+    game_field = GameField()
+    score = Score()
+    tetris = Tetris(game_field, score, random.Random(seed))
+    replay = Replay(seed) if record else None
+    pieces = 0
+    start = time.perf_counter()
+
+    while not tetris.game_over and (max_pieces is None or pieces < max_pieces):
+        if isinstance(player, ReplayPlayer):
+            if player.finished():
+                break
+            player.play(tetris)
+        else:
+            inputs = player.choose(game_field, tetris.current_piece[0], tetris.next_piece[0], budget)
+            if inputs is None:
+                inputs = ["drop"]
+            for name in inputs:
+                getattr(tetris, bot.INPUT_METHODS[name])()
+            if replay is not None:
+                replay.record(inputs)
+        pieces += 1
+
+    result = {
+        "seed": seed,
+        "score": score.score,
+        "lines": score.lines_cleared,
+        "level": score.level,
+        "pieces": pieces,
+        "game_over": tetris.game_over,
+        "seconds": time.perf_counter() - start,
+    }
+    if replay is not None:
+        replay.score = score.score
+        replay.lines = score.lines_cleared
+        result["replay"] = replay.to_dict()
+    return result
+
+
+_worker_players = {}
+
+
+def _run_job(job):
+    # Runs in a worker process; bots are created once per process and reused
+    kind, payload, options = job
+    if kind == "replay":
+        return play_game(payload["seed"], ReplayPlayer(Replay.from_dict(payload)))
+    timed = options["budget"] != float("inf")
+    player = _worker_players.get((options["bot"], timed))
+    if player is None:
+        player = _worker_players[options["bot"], timed] = make_bot(options["bot"], timed)
+    return play_game(payload, player, options["budget"], options["max_pieces"], options["record"])
+
+
+def distribution(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "min": ordered[0],
+        "mean": statistics.fmean(ordered),
+        "median": statistics.median(ordered),
+        "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+        "max": ordered[-1],
+    }
+
+
+def summarize(results, elapsed):
+    pieces = sum(result["pieces"] for result in results)
+    return {
+        "games": len(results),
+        "seconds": elapsed,
+        "games_per_second": len(results) / elapsed if elapsed else 0,
+        "pieces_per_second": pieces / elapsed if elapsed else 0,
+        "score": distribution([result["score"] for result in results]),
+        "lines": distribution([result["lines"] for result in results]),
+        "survival_pieces": distribution([result["pieces"] for result in results]),
+    }
+
+
+def write_output(path, results, summary):
+    if path.endswith(".csv"):
+        fields = ["seed", "score", "lines", "level", "pieces", "game_over", "seconds"]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        games = [{k: v for k, v in result.items() if k != "replay"} for result in results]
+        with open(path, "w") as f:
+            json.dump({"summary": summary, "games": games}, f, indent=2)
+
+
+def run_batch(jobs, workers=1, progress=None):
+    results = []
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(_run_job, jobs, chunksize=1):
+                results.append(result)
+                if progress:
+                    progress(result, len(results), time.perf_counter() - start)
+    else:
+        for job in jobs:
+            results.append(_run_job(job))
+            if progress:
+                progress(results[-1], len(results), time.perf_counter() - start)
+    return results, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run headless Petris games and report statistics")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, the others follow")
+    parser.add_argument("--bot", choices=BOTS, default="greedy")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="thinking time per move in seconds; results then depend on machine speed "
+                             "and load (by default every move searches the full depth, so games are "
+                             "reproducible from the seed)")
+    parser.add_argument("--max-pieces", type=int, default=None, help="stop a game after this many pieces")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--replays", help="play back games from a replay JSONL file instead of a bot")
+    parser.add_argument("--record", help="save the played games as replays to this JSONL file")
+    source.add_argument("--archive", help="append the played games to this replay archive (see archive.py)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="write per-game results to a .json or .csv file")
+    parser.add_argument("--quiet", action="store_true", help="no per-game progress lines")
+    args = parser.parse_args(argv)
+
+    if args.replays:
+        jobs = [("replay", replay.to_dict(), None) for replay in load_replays(args.replays)]
+    else:
+        # Without a budget the search never times out, so the bot's choices depend only on the game
+        budget = args.budget if args.budget is not None else float("inf")
+        options = {"bot": args.bot, "budget": budget,
+                   "max_pieces": args.max_pieces, "record": bool(args.record or args.archive)}
+        jobs = [("bot", args.seed + i, options) for i in range(args.games)]
+
+    def progress(result, done, elapsed):
+        if not args.quiet:
+            print(f"[{done}/{len(jobs)}] seed={result['seed']} score={result['score']} "
+                  f"lines={result['lines']} pieces={result['pieces']} "
+                  f"({done / elapsed:.2f} games/s)", file=sys.stderr, flush=True)
+
+    results, elapsed = run_batch(jobs, args.workers, progress)
+    summary = summarize(results, elapsed)
+
+    if args.record:
+        save_replays(args.record, [Replay.from_dict(result["replay"]) for result in results])
+    if args.archive:
+        from archive import ReplayArchive
+        archive = ReplayArchive(args.archive)
+        for result in results:
+            archive.append(Replay.from_dict(result["replay"]))
+        archive.close()
+    if args.output:
+        write_output(args.output, results, summary)
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
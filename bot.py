@@ -0,0 +1,373 @@
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from Petris_1 import Colors, COLUMNS, GameField, Shapes, Zobrist
+
+
+class TranspositionTable:
+    # Bounded cache keyed by Zobrist hash. Least recently used entries are evicted
+    # first, and an entry is never replaced by a shallower search of the same key.
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, depth=0):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def store(self, key, value, depth=0):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > depth:
+            return
+        self.entries[key] = (depth, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Weights for the board heuristic (higher evaluation is better)
+HEIGHT_WEIGHT = -0.51
+HOLES_WEIGHT = -0.36
+BUMPINESS_WEIGHT = -0.18
+LINES_WEIGHT = 0.76
+LOSS_VALUE = -1e9
+
+evaluation_cache = TranspositionTable()
+
+
+def column_heights(board):
+    rows = len(board)
+    heights = [0] * len(board[0])
+    for j in range(len(heights)):
+        for i in range(rows):
+            if board[i][j] != Colors.BLACK:
+                heights[j] = rows - i
+                break
+    return heights
+
+
+def count_holes(board, heights):
+    rows = len(board)
+    holes = 0
+    for j in range(len(heights)):
+        for i in range(rows - heights[j], rows):
+            if board[i][j] == Colors.BLACK:
+                holes += 1
+    return holes
+
+
+def evaluate_board(board, heights=None):
+    if heights is None:
+        heights = column_heights(board)
+    holes = count_holes(board, heights)
+    bumpiness = sum(abs(heights[j] - heights[j + 1]) for j in range(len(heights) - 1))
+    return (HEIGHT_WEIGHT * sum(heights)
+            + HOLES_WEIGHT * holes
+            + BUMPINESS_WEIGHT * bumpiness)
+
+
+def board_key(field):
+    # The Zobrist hash only covers filled cells, so an empty board hashes to 0 at every
+    # size; the size keeps boards of different sizes apart in the caches
+    return field.hash, field.columns, field.rows
+
+
+def evaluate(game_field, cache=evaluation_cache):
+    # Heuristic evaluation of a GameField, cached by board key. Same value as
+    # evaluate_board, but holes come from the row masks: every cell under a column top
+    # that is not filled.
+    key = board_key(game_field)
+    value = cache.get(key)
+    if value is None:
+        heights = game_field.heights
+        holes = sum(heights) - sum(mask.bit_count() for mask in game_field.masks)
+        bumpiness = sum(abs(heights[j] - heights[j + 1]) for j in range(len(heights) - 1))
+        value = (HEIGHT_WEIGHT * sum(heights)
+                 + HOLES_WEIGHT * holes
+                 + BUMPINESS_WEIGHT * bumpiness)
+        cache.store(key, value)
+    return value
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+_rotations = {}
+
+
+def rotations(shape):
+    key = tuple(map(tuple, shape))
+    result = _rotations.get(key)
+    if result is None:
+        result = _rotations[key] = Shapes.rotations(shape)
+    return result
+
+
+def collides(board, shape, x, y):
+    # Same rules as Tetris.check_collision
+    for i, row in enumerate(shape):
+        for j, cell in enumerate(row):
+            if cell:
+                new_x = x + j
+                new_y = y + i
+                if new_x < 0 or new_x >= len(board[0]) or new_y >= len(board) or new_y < 0:
+                    return True
+                if board[new_y][new_x] != Colors.BLACK:
+                    return True
+    return False
+
+
+def spawn_x(shape, columns=COLUMNS):
+    # Same spawn column as Tetris.spawn_x (it uses the number of rows of the shape)
+    return max(0, min(columns // 2 - len(shape) // 2, columns - len(shape[0])))
+
+
+_bottoms = {}
+
+
+def column_bottoms(shape):
+    # Lowest filled row of each column of a shape
+    key = tuple(map(tuple, shape))
+    result = _bottoms.get(key)
+    if result is None:
+        result = _bottoms[key] = [max(i for i in range(len(shape)) if shape[i][j]) for j in range(len(shape[0]))]
+    return result
+
+
+def drop_placements(field, shape):
+    # (rotation count, x, y, rotated shape, inputs) for every rotation and column,
+    # rotated at the spawn position and dropped straight down. While the rows a piece
+    # enters through are empty, it stops on the highest filled cell of each of its
+    # columns, so the landing row comes from the column heights without stepping down
+    # the board. Otherwise a piece can start below an overhang and is stepped down.
+    result = []
+    start_x = spawn_x(shape, field.columns)
+    rows = field.rows
+    heights = field.heights
+    clear_top = not any(field.masks[:4])
+    for rotation, rotated in enumerate(rotations(shape)):
+        bottoms = column_bottoms(rotated)
+        for x in range(field.columns - len(rotated[0]) + 1):
+            if clear_top:
+                y = rows
+                for j, bottom in enumerate(bottoms):
+                    landing = rows - heights[x + j] - bottom - 1
+                    if landing < y:
+                        y = landing
+            else:
+                if collides(field.board, rotated, x, 0):
+                    continue
+                y = 0
+                while not collides(field.board, rotated, x, y + 1):
+                    y += 1
+            shift = ["right"] * (x - start_x) if x > start_x else ["left"] * (start_x - x)
+            result.append((rotation, x, y, rotated, ["rotate"] * rotation + shift + ["drop"]))
+    return result
+
+
+reachability_cache = TranspositionTable(50000)
+
+
+def reachable_placements(field, shape, cache=reachability_cache):
+    # Breadth-first search over (x, y, rotation) states using the same moves as
+    # Tetris.move_left, move_right, rotate_piece and move_down. Returns every distinct
+    # lock position with the shortest input sequence that reaches it, including
+    # tucks and spins under overhangs that a straight drop from the top misses.
+    key = (board_key(field), Zobrist.piece_key(shape))
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    board = field.board
+    shapes = rotations(shape)
+    start = (spawn_x(shape, field.columns), 0, 0)
+    result = []
+    if collides(board, shape, start[0], start[1]):
+        cache.store(key, result)
+        return result
+
+    parents = {start: None}
+    landing = {}
+    locked = set()
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        x, y, r = state
+
+        # Hard drop from here; landing heights are shared by every state above in the same column
+        path = []
+        below = state
+        while below not in landing:
+            path.append(below)
+            if collides(board, shapes[r], x, below[1] + 1):
+                landing[below] = below[1]
+                break
+            below = (x, below[1] + 1, r)
+        land = landing[below]
+        for visited in path:
+            landing[visited] = land
+
+        if (r, x, land) not in locked:
+            locked.add((r, x, land))
+            inputs = ["drop"]
+            node = state
+            while parents[node] is not None:
+                node, name = parents[node]
+                inputs.append(name)
+            inputs.reverse()
+            result.append((r, x, land, shapes[r], inputs))
+
+        for name, nxt in (("left", (x - 1, y, r)), ("right", (x + 1, y, r)),
+                          ("rotate", (x, y, (r + 1) % len(shapes))), ("down", (x, y + 1, r))):
+            if nxt not in parents and not collides(board, shapes[nxt[2]], nxt[0], nxt[1]):
+                parents[nxt] = (state, name)
+                queue.append(nxt)
+
+    cache.store(key, result)
+    return result
+
+
+INPUT_METHODS = {
+    "left": "move_left",
+    "right": "move_right",
+    "rotate": "rotate_piece",
+    "down": "move_down",
+    "drop": "drop",
+}
+
+
+class ExpectimaxBot:
+    # Searches the current piece, the known next piece and then takes the expectation
+    # over the uniform shape choice of Shapes.new_piece. depth counts placed pieces,
+    # so depth 1 is plain greedy placement. With reachable=True moves come from the
+    # input-graph search instead of straight drops from the top.
+    def __init__(self, depth=3, workers=0, table_size=200000, reachable=False):
+        self.depth = depth
+        self.reachable = reachable
+        self.placements = reachable_placements if reachable else drop_placements
+        self.table = TranspositionTable(table_size)
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.completed_depth = 0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def value(self, field, shape, next_shape, depth, deadline):
+        # Best value reachable by placing shape on field and searching depth - 1 more pieces
+        if time.monotonic() > deadline:
+            raise SearchTimeout()
+        key = (board_key(field), Zobrist.piece_key(shape), Zobrist.piece_key(next_shape) if next_shape else 0)
+        cached = self.table.get(key, depth)
+        if cached is not None:
+            return cached
+
+        best = LOSS_VALUE
+        for rotation, x, y, rotated, inputs in self.placements(field, shape):
+            if time.monotonic() > deadline:
+                raise SearchTimeout()
+            best = max(best, self.placement_value(field, rotated, x, y, next_shape, depth - 1, deadline))
+
+        self.table.store(key, best, depth)
+        return best
+
+    def placement_value(self, field, shape, x, y, next_shape, depth, deadline):
+        after = field.copy()
+        after.place_shape(shape, Colors.WHITE, x, y)
+        reward = LINES_WEIGHT * after.clear_lines(range(y, y + len(shape)))
+
+        if depth == 0:
+            return reward + evaluate(after)
+        if next_shape is not None:
+            return reward + self.value(after, next_shape, None, depth, deadline)
+
+        total = 0
+        for piece in Shapes.SHAPES:
+            total += self.value(after, piece, None, depth, deadline)
+        return reward + total / len(Shapes.SHAPES)
+
+    def root_values(self, field, roots, next_shape, depth, deadline):
+        # The greedy pass (depth 0) is never abandoned: past the deadline it returns the
+        # values of the roots evaluated so far, at least one
+        if self.pool is None or depth == 0:
+            values = []
+            for rotation, x, y, rotated, inputs in roots:
+                if values and time.monotonic() > deadline:
+                    if depth == 0:
+                        break
+                    raise SearchTimeout()
+                values.append(self.placement_value(field, rotated, x, y, next_shape, depth, deadline))
+            return values
+
+        futures = [
+            self.pool.submit(_worker_placement_value, field.board,
+                             rotated, x, y, next_shape, depth, deadline, self.reachable)
+            for rotation, x, y, rotated, inputs in roots
+        ]
+        done, pending = wait(futures, timeout=max(0, deadline - time.monotonic()))
+        for future in pending:
+            future.cancel()
+        if pending or any(future.exception() is not None for future in done):
+            raise SearchTimeout()
+        return [future.result() for future in futures]
+
+    def choose(self, field, shape, next_shape=None, budget=0.01):
+        # Iterative deepening: returns the input sequence of the best root move found by
+        # the deepest iteration that finished before the deadline, or None if nothing fits.
+        deadline = time.monotonic() + budget
+        roots = self.placements(field, shape)
+        if not roots:
+            return None
+
+        best = None
+        self.completed_depth = 0
+        for depth in range(1, self.depth + 1):
+            try:
+                values = self.root_values(field, roots, next_shape, depth - 1, deadline)
+            except SearchTimeout:
+                break
+            best = roots[max(range(len(values)), key=values.__getitem__)]
+            if len(values) < len(roots):
+                break  # The greedy pass ran out of time part way
+            self.completed_depth = depth
+
+        return best[4]
+
+    def play(self, tetris, budget=0.01):
+        # Feed the inputs of the chosen placement to the game, ending with a hard drop
+        inputs = self.choose(tetris.game_field, tetris.current_piece[0], tetris.next_piece[0], budget)
+        if inputs is None:
+            inputs = ["drop"]
+        for name in inputs:
+            getattr(tetris, INPUT_METHODS[name])()
+
+
+_worker_bots = {}
+
+
+def _worker_placement_value(board, shape, x, y, next_shape, depth, deadline, reachable):
+    # Runs in a pool process; keeps its own transposition table between calls
+    worker_bot = _worker_bots.get(reachable)
+    if worker_bot is None:
+        worker_bot = _worker_bots[reachable] = ExpectimaxBot(reachable=reachable)
+    field = GameField.from_board(board)
+    return worker_bot.placement_value(field, shape, x, y, next_shape, depth, deadline)
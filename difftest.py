@@ -0,0 +1,199 @@
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import Petris_1
+import reference
+from Petris_1 import ROWS
+from replay import INPUT_METHODS, load_replays
+
+# Differential test: plays the same seeded action sequences through the reference
+# engine (reference.py) and the optimized engine (Petris_1.py) and checks after every
+# step that both are in the same state. A failing sequence is shrunk to a minimal
+# replay that still shows the mismatch.
+#
+#   python difftest.py --sequences 100000 --length 400 --workers 8
+#
+# Actions use the replay input codes (L, R, C, D, H) plus "G<n>" for n rows of gravity.
+
+
+def new_games(seed):
+    games = []
+    for module in (reference, Petris_1):
+        game_field = module.GameField()
+        score = module.Score()
+        games.append(module.Tetris(game_field, score, random.Random(seed)))
+    return games
+
+
+def apply(tetris, action):
+    if action[0] == "G":
+        tetris.fall(int(action[1:]))
+    else:
+        getattr(tetris, INPUT_METHODS[action])()
+
+
+def state(tetris):
+    score = tetris.score
+    return {
+        "board": [list(row) for row in tetris.game_field.board],
+        "score": score.score,
+        "streak": score.streak,
+        "level": score.level,
+        "lines": score.lines_cleared,
+        "game_over": tetris.game_over,
+        "x": tetris.x,
+        "y": tetris.y,
+        "current_piece": tetris.current_piece,
+        "next_piece": tetris.next_piece,
+    }
+
+
+def invariant_errors(tetris):
+    # Derived state the optimized engine maintains incrementally
+    field = tetris.game_field
+    errors = []
+    if field.masks != [field.scan_row(i) for i in range(field.rows)]:
+        errors.append("row masks")
+    expected_hash = 0
+    for i in range(field.rows):
+        expected_hash ^= field.row_hash(i)
+    if field.hash != expected_hash:
+        errors.append("zobrist hash")
+    if field.heights != [field.column_height(j) for j in range(field.columns)]:
+        errors.append("skyline heights")
+    return errors
+
+
+def compare(expected, actual):
+    expected_state = state(expected)
+    actual_state = state(actual)
+    differences = [key for key in expected_state if expected_state[key] != actual_state[key]]
+    return differences + invariant_errors(actual)
+
+
+def first_mismatch(seed, actions):
+    # Index of the first step after which the engines disagree (-1 for the initial
+    # state) and what differs, or None when the whole sequence matches
+    expected, actual = new_games(seed)
+    differences = compare(expected, actual)
+    if differences:
+        return -1, differences
+    for i, action in enumerate(actions):
+        if expected.game_over and actual.game_over:
+            break
+        apply(expected, action)
+        apply(actual, action)
+        differences = compare(expected, actual)
+        if differences:
+            return i, differences
+    return None
+
+
+def shrink(seed, actions):
+    # Delta debugging: drop chunks of actions while the mismatch persists
+    failure = first_mismatch(seed, actions)
+    actions = actions[:failure[0] + 1]
+    chunk = max(1, len(actions) // 2)
+    while True:
+        i = 0
+        removed = False
+        while i < len(actions):
+            candidate = actions[:i] + actions[i + chunk:]
+            failure = first_mismatch(seed, candidate)
+            if failure is not None:
+                actions = candidate[:failure[0] + 1]
+                removed = True
+            else:
+                i += chunk
+        if chunk == 1 and not removed:
+            return actions
+        if not removed:
+            chunk //= 2
+
+
+def random_actions(rng, length):
+    actions = []
+    for _ in range(length):
+        r = rng.random()
+        if r < 0.3:
+            actions.append(rng.choice("LR"))
+        elif r < 0.45:
+            actions.append("C")
+        elif r < 0.65:
+            actions.append("D")
+        elif r < 0.8:
+            actions.append(f"G{rng.randint(1, ROWS)}")
+        else:
+            actions.append("H")
+    return actions
+
+
+def check_random(first_seed, count, length):
+    # Runs in a worker process; returns the failing (seed, actions) pairs
+    failures = []
+    for seed in range(first_seed, first_seed + count):
+        actions = random_actions(random.Random(seed), length)
+        if first_mismatch(seed, actions) is not None:
+            failures.append((seed, actions))
+    return failures
+
+
+def report(seed, actions, output):
+    minimal = shrink(seed, actions)
+    index, differences = first_mismatch(seed, minimal)
+    result = {"seed": seed, "actions": minimal, "mismatch_step": index, "differences": differences}
+    print(f"MISMATCH seed={seed} after {len(minimal)} actions: {', '.join(differences)}", file=sys.stderr)
+    print(json.dumps(result))
+    if output:
+        with open(output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the optimized engine against the reference engine")
+    parser.add_argument("--sequences", type=int, default=10000, help="number of random action sequences")
+    parser.add_argument("--length", type=int, default=300, help="actions per random sequence")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first sequence")
+    parser.add_argument("--replays", help="also check the games in a replay JSONL file")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="append shrunk failing sequences to this JSONL file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    failures = []
+
+    if args.replays:
+        for replay in load_replays(args.replays):
+            actions = [code for move in replay.moves for code in move]
+            if first_mismatch(replay.seed, actions) is not None:
+                failures.append((replay.seed, actions))
+
+    chunk = 500
+    jobs = [(seed, min(chunk, args.seed + args.sequences - seed), args.length)
+            for seed in range(args.seed, args.seed + args.sequences, chunk)]
+    done = 0
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for job, result in zip(jobs, pool.map(check_random, *zip(*jobs))):
+                failures.extend(result)
+                done += job[1]
+                print(f"{done}/{args.sequences} sequences", file=sys.stderr, flush=True)
+    else:
+        for job in jobs:
+            failures.extend(check_random(*job))
+            done += job[1]
+            print(f"{done}/{args.sequences} sequences", file=sys.stderr, flush=True)
+
+    for seed, actions in failures:
+        report(seed, actions, args.output)
+
+    print(f"{len(failures)} mismatching sequences, {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
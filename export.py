@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import os
+import sys
+
+import pygame
+
+from Petris_1 import FPS, Game, OffscreenRenderer
+from replay import ReplayPlayer, load_replays
+
+# Frame export for replays and live games. Frames go to a sink as soon as they are
+# rendered, so memory use does not depend on the length of the game.
+#
+#   python export.py replays.jsonl --game 0 --output clip.gif --skip 2 --scale 0.5
+#   python export.py replays.jsonl --output frames/frame_%06d.png
+#   python export.py replays.jsonl --output - | ffmpeg -f rawvideo -pix_fmt rgb24 -s 500x600 -r 60 -i - out.mp4
+#
+# A live window is exported with `python Petris_1.py --export clip.gif`.
+
+
+class RawSink:
+    # Packed 24-bit RGB frames back to back, the input format of ffmpeg -f rawvideo
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, surface, time):
+        self.stream.write(pygame.image.tobytes(surface, "RGB"))
+
+    def close(self):
+        self.stream.flush()
+        if self.stream is not sys.stdout.buffer:
+            self.stream.close()
+
+
+class PngSink:
+    # One PNG per frame; pattern is a %-format path such as "frames/frame_%06d.png"
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.count = 0
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, surface, time):
+        pygame.image.save(surface, self.pattern % self.count)
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+def gif_palette():
+    # 6x6x6 color cube; the game only uses saturated colors, grays and black
+    levels = [0, 51, 102, 153, 204, 255]
+    palette = bytearray()
+    for r in levels:
+        for g in levels:
+            for b in levels:
+                palette += bytes((r, g, b))
+    return bytes(palette + bytes(3 * (256 - 216)))
+
+
+# Per channel byte -> its contribution to the palette index. The three contributions
+# add up to at most 215, so whole frames can be summed as big integers without carries.
+QUANTIZE = [bytes(min(5, (value + 25) // 51) * weight for value in range(256)) for weight in (36, 6, 1)]
+
+
+def quantize(rgb):
+    size = len(rgb) // 3
+    index = 0
+    for channel, table in enumerate(QUANTIZE):
+        index += int.from_bytes(rgb[channel::3].translate(table), "big")
+    return index.to_bytes(size, "big")
+
+
+def lzw_encode(pixels, min_code_size=8):
+    # GIF flavoured LZW: variable code width up to 12 bits, LSB-first bit packing
+    clear = 1 << min_code_size
+    end = clear + 1
+    out = bytearray()
+    bits = 0
+    bit_count = 0
+
+    def emit(code, width):
+        nonlocal bits, bit_count
+        bits |= code << bit_count
+        bit_count += width
+        while bit_count >= 8:
+            out.append(bits & 0xFF)
+            bits >>= 8
+            bit_count -= 8
+
+    width = min_code_size + 1
+    table = {bytes((i,)): i for i in range(clear)}
+    next_code = end + 1
+    emit(clear, width)
+    prefix = b""
+    for value in pixels:
+        candidate = prefix + bytes((value,))
+        if candidate in table:
+            prefix = candidate
+            continue
+        emit(table[prefix], width)
+        if next_code < 4096:
+            table[candidate] = next_code
+            next_code += 1
+            if next_code > 1 << width and width < 12:
+                width += 1
+        else:
+            emit(clear, width)
+            table = {bytes((i,)): i for i in range(clear)}
+            next_code = end + 1
+            width = min_code_size + 1
+        prefix = bytes((value,))
+    if prefix:
+        emit(table[prefix], width)
+    emit(end, width)
+    if bit_count:
+        out.append(bits & 0xFF)
+    return bytes(out)
+
+
+class GifSink:
+    # Streaming animated GIF. Each frame only encodes the rows that changed since the
+    # previous one, and runs of identical frames become one longer frame.
+    def __init__(self, path, loop=True):
+        self.file = open(path, "wb")
+        self.loop = loop
+        self.size = None
+        self.previous = None
+        self.pending = None  # (top, rows, start time) of the frame waiting for its delay
+
+    def header(self, width, height):
+        self.file.write(b"GIF89a" + width.to_bytes(2, "little") + height.to_bytes(2, "little")
+                        + bytes((0xF7, 0, 0)) + gif_palette())
+        if self.loop:
+            self.file.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    def write(self, surface, time):
+        width, height = surface.get_size()
+        if self.size is None:
+            self.size = (width, height)
+            self.header(width, height)
+        pixels = quantize(pygame.image.tobytes(surface, "RGB"))
+
+        if self.previous is None:
+            top, bottom = 0, height
+        else:
+            changed = [i for i in range(height)
+                       if pixels[i * width:(i + 1) * width] != self.previous[i * width:(i + 1) * width]]
+            if not changed:
+                return  # Same picture; the pending frame just lasts longer
+            top, bottom = changed[0], changed[-1] + 1
+        self.previous = pixels
+        self.flush_pending(time)
+        self.pending = (top, pixels[top * width:bottom * width], time)
+
+    def flush_pending(self, time):
+        if self.pending is None:
+            return
+        top, rows, start = self.pending
+        self.pending = None
+        width = self.size[0]
+        delay = max(1, round(time * 100) - round(start * 100))
+        # Graphic control (keep the previous frame under this one), image descriptor, data
+        self.file.write(b"\x21\xF9\x04\x04" + delay.to_bytes(2, "little") + b"\x00\x00")
+        self.file.write(b"\x2C" + (0).to_bytes(2, "little") + top.to_bytes(2, "little")
+                        + width.to_bytes(2, "little") + (len(rows) // width).to_bytes(2, "little") + b"\x00")
+        data = lzw_encode(rows)
+        self.file.write(b"\x08")
+        for i in range(0, len(data), 255):
+            block = data[i:i + 255]
+            self.file.write(bytes((len(block),)) + block)
+        self.file.write(b"\x00")
+
+    def close(self, time=None):
+        if self.pending is not None:
+            self.flush_pending(time if time is not None else self.pending[2] + 1)
+        self.file.write(b"\x3B")
+        self.file.close()
+
+
+def open_sink(path):
+    if path == "-":
+        return RawSink(sys.stdout.buffer)
+    if path.endswith(".gif"):
+        return GifSink(path)
+    if path.endswith(".png"):
+        return PngSink(path if "%" in path else path[:-4] + "_%06d.png")
+    return RawSink(open(path, "wb"))
+
+
+class ExportRenderer:
+    # Wraps another renderer and sends every skip-th presented frame to a sink,
+    # scaled by scale. Wrapping PygameRenderer records a live game, wrapping
+    # OffscreenRenderer renders a replay headless.
+    def __init__(self, renderer, sink, skip=1, scale=1.0, framerate=FPS):
+        self.renderer = renderer
+        self.sink = sink
+        self.skip = skip
+        self.scale = scale
+        self.framerate = framerate
+        self.interactive = renderer.interactive
+        self.frames = 0
+        self.exported = 0
+        self.scaled = None
+
+    def events(self):
+        return self.renderer.events()
+
+    def draw_board(self, game):
+        self.renderer.draw_board(game)
+
+    def draw_game(self, game):
+        self.renderer.draw_game(game)
+
+    def draw_overlay(self, game, overlay):
+        self.renderer.draw_overlay(game, overlay)
+
+    def draw_menu(self, menu):
+        self.renderer.draw_menu(menu)
+
+    def present(self):
+        self.renderer.present()
+        if self.frames % self.skip == 0:
+            self.sink.write(self.frame(), self.frames / self.framerate)
+            self.exported += 1
+        self.frames += 1
+
+    def frame(self):
+        surface = self.renderer.screen
+        if self.scale == 1.0:
+            return surface
+        if self.scaled is None:
+            width, height = surface.get_size()
+            self.scaled = pygame.Surface((max(1, int(width * self.scale)), max(1, int(height * self.scale))))
+        pygame.transform.smoothscale(surface, self.scaled.get_size(), self.scaled)
+        return self.scaled
+
+    def close(self):
+        if isinstance(self.sink, GifSink):
+            self.sink.close(self.frames / self.framerate)
+        else:
+            self.sink.close()
+
+
+def export_replay(replay, path, skip=1, scale=1.0):
+    # Plays the replay at game speed (one piece per gravity step) into the sink
+    renderer = ExportRenderer(OffscreenRenderer(), open_sink(path), skip, scale)
+    game = Game(ReplayPlayer(replay), seed=replay.seed, renderer=renderer, framerate=0)
+    try:
+        asyncio.run(game.play())
+    finally:
+        renderer.close()
+    return renderer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a replay as raw RGB frames, PNGs or a GIF")
+    parser.add_argument("replays", help="replay JSONL file")
+    parser.add_argument("--game", type=int, default=0, help="index of the replay in the file")
+    parser.add_argument("--output", default="-", help="'-' for raw RGB on stdout, *.gif, *.png or a raw file")
+    parser.add_argument("--skip", type=int, default=1, help="export every n-th frame")
+    parser.add_argument("--scale", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    for index, replay in enumerate(load_replays(args.replays)):
+        if index == args.game:
+            renderer = export_replay(replay, args.output, args.skip, args.scale)
+            width, height = renderer.frame().get_size()
+            print(f"{renderer.exported} frames of {width}x{height} at {FPS / args.skip:g} fps",
+                  file=sys.stderr)
+            return 0
+    print(f"No replay {args.game} in {args.replays}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import json
+import sys
+import time
+import tracemalloc
+
+# Memory profiling for the game loops (python Petris_1.py --memprofile).
+#
+# Per frame phase (the Game on_phase hook) it records, from tracemalloc's counters:
+#   churn     peak traced memory during the phase above what was traced at its start,
+#             i.e. temporary allocations that were freed again (fonts, surfaces, lists)
+#   retained  traced memory at the end of the phase minus at its start
+# To find where the churn comes from, every site_every-th frame is sampled: a snapshot
+# is taken at each phase boundary of that frame, and every allocation site that grew
+# between two boundaries is credited with the growth. A temporary allocated in the draw
+# phase and dropped on the next frame is caught this way, one that lives and dies inside
+# a single phase is only in the churn numbers. Traced memory is also sampled at an
+# interval to show the retained-memory trend of the session.
+#
+# tracemalloc only sees allocations made through Python. Pixel data of SDL surfaces and
+# fonts is allocated in C and appears in none of these numbers; only the small Python
+# wrapper objects do.
+
+SCREENS = {"menu": "menu", "game_over": "game_over", "high_scores": "high_scores"}
+FRAME_STARTS = ("wait", "menu", "game_over", "high_scores")  # First phase of a frame
+
+
+class MemoryProfiler:
+    def __init__(self, frames=10, sample_interval=1.0, top=10, output=None, site_every=60):
+        self.sample_interval = sample_interval
+        self.site_every = site_every
+        self.top = top
+        self.output = output
+        tracemalloc.start(frames)
+        self.filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+        self.start_time = time.perf_counter()
+        self.phase = None
+        self.phase_start = 0
+        self.phases = {}  # (screen, phase) -> [frames, churn total, retained total, churn max]
+        self.frames = 0
+        self.site_screen = None
+        self.site_snapshot = None  # Last snapshot of the frame being sampled
+        self.sampled_frames = {}  # screen -> frames sampled
+        self.sites = {}  # screen -> {site: bytes allocated in sampled frames}
+        self.samples = []  # (seconds, traced bytes)
+        self.next_sample = 0.0
+
+    def attach(self, game):
+        game.add_hook("on_phase", self.on_phase)
+
+    def on_phase(self, game, phase):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.phase is not None:
+            stats = self.phases.get(self.phase)
+            if stats is None:
+                stats = self.phases[self.phase] = [0, 0, 0, 0]
+            churn = peak - self.phase_start
+            stats[0] += 1
+            stats[1] += churn
+            stats[2] += current - self.phase_start
+            stats[3] = max(stats[3], churn)
+
+        screen = SCREENS.get(phase, "game")
+        starts_frame = phase in FRAME_STARTS
+        if self.site_snapshot is not None:
+            self.sample_sites(last=starts_frame)
+        if starts_frame:
+            self.frames += 1
+            if self.frames % self.site_every == 0:
+                self.site_screen = screen
+                self.sampled_frames[screen] = self.sampled_frames.get(screen, 0) + 1
+                self.sample_sites(last=False)
+        now = time.perf_counter() - self.start_time
+        if now >= self.next_sample:
+            self.samples.append((now, current))
+            self.next_sample = now + self.sample_interval
+
+        self.phase = (screen, phase)
+        tracemalloc.reset_peak()
+        self.phase_start = tracemalloc.get_traced_memory()[0]
+
+    def sample_sites(self, last):
+        # Credits the sites that grew since the previous boundary of the sampled frame.
+        # Snapshots are slow, so they are only taken in sampled frames.
+        snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+        if self.site_snapshot is not None:
+            sites = self.sites.setdefault(self.site_screen, {})
+            for diff in snapshot.compare_to(self.site_snapshot, "lineno"):
+                if diff.size_diff > 0:
+                    frame = diff.traceback[0]
+                    site = f"{frame.filename}:{frame.lineno}"
+                    sites[site] = sites.get(site, 0) + diff.size_diff
+        self.site_snapshot = None if last else snapshot
+
+    def trend(self):
+        # Least squares slope of traced memory in bytes per minute
+        if len(self.samples) < 2:
+            return 0.0
+        n = len(self.samples)
+        mean_t = sum(t for t, _ in self.samples) / n
+        mean_m = sum(m for _, m in self.samples) / n
+        variance = sum((t - mean_t) ** 2 for t, _ in self.samples)
+        if not variance:
+            return 0.0
+        covariance = sum((t - mean_t) * (m - mean_m) for t, m in self.samples)
+        return covariance / variance * 60
+
+    def results(self):
+        phases = []
+        for (screen, phase), (frames, churn, retained, churn_max) in self.phases.items():
+            phases.append({
+                "screen": screen,
+                "phase": phase,
+                "frames": frames,
+                "churn_per_frame": churn / frames,
+                "retained_per_frame": retained / frames,
+                "churn_max": churn_max,
+            })
+        sites = {}
+        for screen, grown in self.sites.items():
+            frames = self.sampled_frames[screen]
+            ranked = sorted(grown.items(), key=lambda item: -item[1])[:self.top]
+            sites[screen] = [{"site": site, "bytes_per_frame": size / frames} for site, size in ranked]
+        return {
+            "seconds": time.perf_counter() - self.start_time,
+            "traced_bytes": tracemalloc.get_traced_memory()[0],
+            "trend_bytes_per_minute": self.trend(),
+            "phases": phases,
+            "sites": sites,
+        }
+
+    def report(self, file=sys.stderr):
+        # Finish a frame that is still being sampled
+        if self.site_snapshot is not None:
+            self.sample_sites(last=True)
+        results = self.results()
+        print(f"memory profile: {results['seconds']:.0f}s, {results['traced_bytes'] / 1024:.0f} KiB traced, "
+              f"trend {results['trend_bytes_per_minute'] / 1024:+.1f} KiB/min", file=file)
+        print(f"{'screen':<12} {'phase':<12} {'frames':>8} {'churn B/frame':>14} "
+              f"{'retained B/frame':>17} {'churn max':>10}", file=file)
+        for row in sorted(results["phases"], key=lambda row: -row["churn_per_frame"]):
+            print(f"{row['screen']:<12} {row['phase']:<12} {row['frames']:>8} {row['churn_per_frame']:>14.0f} "
+                  f"{row['retained_per_frame']:>17.1f} {row['churn_max']:>10}", file=file)
+        for screen, sites in results["sites"].items():
+            print(f"top allocating sites on {screen} ({self.sampled_frames[screen]} sampled frames):", file=file)
+            for site in sites:
+                print(f"  {site['bytes_per_frame']:>10.0f} B/frame  {site['site']}", file=file)
+        print("(Python allocations only: SDL surface and font memory is allocated in C and not traced)",
+              file=file)
+        if self.output:
+            with open(self.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return results
+
+    def stop(self):
+        tracemalloc.stop()
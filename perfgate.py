@@ -0,0 +1,205 @@
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from Petris_1 import Game, OffscreenRenderer
+from replay import ReplayPlayer, load_replays
+
+# Performance gate: replays a checked-in corpus of games end to end through Game.run,
+# drawing every frame with OffscreenRenderer and no frame limit, and compares the
+# cost of each frame phase with stored thresholds. Exits 1 on a regression.
+#
+#   python perfgate.py                  check against perfgate.json
+#   python perfgate.py --update         measure this machine and store it as the baseline
+#
+# Per phase (the Game on_phase hook) it measures time per frame, and in a separate pass
+# under tracemalloc, which slows down everything it traces, the bytes allocated and
+# freed again per frame (churn, as in memprofile.py). That pass also measures how much
+# traced memory is left over after each game; growth from the first game to the last
+# is a leak. The frame count and final score of every game must match exactly, since
+# the corpus is deterministic.
+
+CORPUS = "perfgate_corpus.jsonl"
+THRESHOLDS = "perfgate.json"
+PHASES = ("wait", "gravity", "input", "draw", "present")
+
+# A metric regresses when it exceeds baseline * (1 + tolerance) + slack. The slack
+# keeps phases that cost next to nothing from failing on noise.
+TOLERANCE = {"us_per_frame": 0.25, "churn_per_frame": 0.10, "leaked_bytes": 0.10}
+SLACK = {"us_per_frame": 2.0, "churn_per_frame": 256, "leaked_bytes": 16384}
+
+
+class PhaseTimer:
+    # Time spent in each frame phase, from one on_phase call to the next
+    def __init__(self):
+        self.phase = None
+        self.start = 0.0
+        self.totals = {}  # phase -> [frames, seconds]
+
+    def attach(self, game):
+        game.add_hook("on_phase", self.on_phase)
+        game.add_hook("on_game_over", self.on_game_over)
+
+    def on_phase(self, game, phase):
+        self.close_phase()
+        self.phase = phase
+        self.start = self.begin()
+
+    def on_game_over(self, game):
+        self.close_phase()
+        self.phase = None
+
+    def close_phase(self):
+        if self.phase is not None:
+            totals = self.totals.get(self.phase)
+            if totals is None:
+                totals = self.totals[self.phase] = [0, 0]
+            totals[0] += 1
+            totals[1] += self.end()
+
+    def begin(self):
+        return time.perf_counter()
+
+    def end(self):
+        return time.perf_counter() - self.start
+
+
+class PhaseChurn(PhaseTimer):
+    # Peak traced memory during each frame phase above what was traced at its start,
+    # i.e. bytes allocated and freed again. Needs tracemalloc to be running.
+    def begin(self):
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+    def end(self):
+        return tracemalloc.get_traced_memory()[1] - self.start
+
+
+def play(replay, attach=None):
+    game = Game(ReplayPlayer(replay), seed=replay.seed, renderer=OffscreenRenderer(), framerate=0)
+    if attach is not None:
+        attach(game)
+    game.run()
+    return game
+
+
+def measure(replays, repeat=3):
+    # Time per frame: the best of repeat passes over the whole corpus, which also
+    # leaves out the first pass warming up fonts and caches
+    phases = {}
+    for _ in range(repeat):
+        timer = PhaseTimer()
+        for replay in replays:
+            play(replay, timer.attach)
+        for phase, (frames, seconds) in timer.totals.items():
+            us = seconds / frames * 1e6
+            entry = phases.setdefault(phase, {"frames": frames, "us_per_frame": us})
+            entry["us_per_frame"] = min(entry["us_per_frame"], us)
+
+    # Allocations, and what is still traced after each game
+    churn = PhaseChurn()
+    traced = []
+    games = []
+    tracemalloc.start()
+    for replay in replays:
+        game = play(replay, churn.attach)
+        games.append({"seed": replay.seed, "frames": game.renderer.frames, "score": game.score.score})
+        del game
+        gc.collect()
+        traced.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    for phase, (frames, total) in churn.totals.items():
+        if phase in phases:
+            phases[phase]["churn_per_frame"] = total / frames
+
+    return {
+        "games": games,
+        "leaked_bytes": traced[-1] - traced[0],
+        "phases": {phase: phases[phase] for phase in PHASES if phase in phases},
+    }
+
+
+def compare(results, baseline):
+    # Returns (regressions, report lines)
+    regressions = []
+    lines = []
+    expected = {game["seed"]: game for game in baseline["games"]}
+    for game in results["games"]:
+        stored = expected.get(game["seed"])
+        if stored is None:
+            regressions.append(f"seed {game['seed']}: not in the baseline, run with --update")
+        elif (game["frames"], game["score"]) != (stored["frames"], stored["score"]):
+            regressions.append(f"seed {game['seed']}: {game['frames']} frames, score {game['score']}, "
+                               f"expected {stored['frames']} frames, score {stored['score']}")
+
+    rows = [("corpus", baseline, results)]
+    for phase, stored in baseline["phases"].items():
+        measured = results["phases"].get(phase)
+        if measured is None:
+            regressions.append(f"{phase}: phase no longer reported")
+        else:
+            rows.append((phase, stored, measured))
+
+    lines.append(f"{'phase':<10} {'metric':<16} {'baseline':>12} {'measured':>12} {'change':>8}")
+    for name, stored, measured in rows:
+        for metric, tolerance in TOLERANCE.items():
+            if metric not in stored or metric not in measured:
+                continue
+            old, new = stored[metric], measured[metric]
+            change = f"{(new - old) / abs(old):+.0%}" if old else ""
+            verdict = ""
+            if new > old + abs(old) * tolerance + SLACK[metric]:
+                verdict = "  REGRESSION"
+                regressions.append(f"{name} {metric}: {new:.1f}, baseline {old:.1f}")
+            lines.append(f"{name:<10} {metric:<16} {old:>12.1f} {new:>12.1f} {change:>8}{verdict}")
+    return regressions, lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the corpus end to end and fail on performance regressions")
+    parser.add_argument("--corpus", default=CORPUS, help="replay JSONL file")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="stored baseline JSON")
+    parser.add_argument("--repeat", type=int, default=3, help="timing passes, the best one counts")
+    parser.add_argument("--tolerance", type=float, help="allowed slowdown for every metric, e.g. 0.5 for 50%%")
+    parser.add_argument("--update", action="store_true", help="store the measurements as the new baseline")
+    parser.add_argument("--output", help="also write the measurements to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.tolerance is not None:
+        for metric in TOLERANCE:
+            TOLERANCE[metric] = args.tolerance
+
+    replays = list(load_replays(args.corpus))
+    start = time.perf_counter()
+    results = measure(replays, args.repeat)
+    frames = sum(game["frames"] for game in results["games"])
+    print(f"{len(replays)} games, {frames} frames, {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update:
+        with open(args.thresholds, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.thresholds}", file=sys.stderr)
+        return 0
+
+    with open(args.thresholds, "r") as f:
+        baseline = json.load(f)
+    regressions, lines = compare(results, baseline)
+    for line in lines:
+        print(line)
+    if regressions:
+        print(f"FAIL: {len(regressions)} regression(s)", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        return 1
+    print("PASS", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
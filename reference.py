@@ -0,0 +1,141 @@
+import random
+
+from Petris_1 import Colors, Shapes, COLUMNS, ROWS
+
+# The original list-based game logic, kept unchanged as the reference the optimized
+# engine in Petris_1.py is tested against (see difftest.py). Do not optimize this file.
+
+
+class GameField:
+    def __init__(self):
+        self.board = []
+        for i in range(ROWS):
+            self.board.append([Colors.BLACK] * COLUMNS)
+
+    def clear_lines(self):
+        full_lines = []
+        for i, row in enumerate(self.board):
+            if all(cell != Colors.BLACK for cell in row):
+                full_lines.append(i)
+
+        for i in full_lines:
+            del self.board[i]
+            self.board.insert(0, [Colors.BLACK] * COLUMNS)
+
+        return len(full_lines)
+
+
+class Tetris:
+    def __init__(self, game_field, score, rng=random):
+        self.game_field = game_field
+        self.score = score
+        self.rng = rng
+        self.current_piece = Shapes.new_piece(rng)
+        self.next_piece = Shapes.new_piece(rng)
+        self.x = COLUMNS // 2 - len(self.current_piece[0]) // 2
+        self.y = 0
+        self.game_over = False
+
+    def rotate_piece(self):
+        shape, color = self.current_piece
+        original_shape = shape
+        new_shape = [list(row) for row in zip(*shape[::-1])]
+        self.current_piece = (new_shape, color)
+
+        if self.check_collision(0, 0):
+            self.current_piece = (original_shape, color)
+
+    def check_collision(self, offset_x, offset_y):
+        shape, color = self.current_piece
+        for i, row in enumerate(shape):
+            for j, cell in enumerate(row):
+                if cell:
+                    new_x = self.x + j + offset_x
+                    new_y = self.y + i + offset_y
+                    if new_x < 0 or new_x >= COLUMNS or new_y >= ROWS or new_y < 0:
+                        return True
+                    if new_y >= 0 and self.game_field.board[new_y][new_x] != Colors.BLACK:
+                        return True
+        return False
+
+    def place_piece(self):
+        self.score.add_placement()
+        for i, row in enumerate(self.current_piece[0]):
+            for j, cell in enumerate(row):
+                if cell:
+                    self.game_field.board[self.y + i][self.x + j] = self.current_piece[1]
+        lines_cleared = self.game_field.clear_lines()
+        self.score.add_score(lines_cleared)
+
+    def drop(self):
+        while not self.check_collision(0, 1):
+            self.y += 1
+        self.place_piece()
+        self.current_piece = self.next_piece
+        self.next_piece = Shapes.new_piece(self.rng)
+        self.x = COLUMNS // 2 - len(self.current_piece[0]) // 2
+        self.y = 0
+        if self.check_collision(0, 0):
+            self.game_over = True
+
+    def move_left(self):
+        if not self.check_collision(-1, 0):
+            self.x -= 1
+
+    def move_right(self):
+        if not self.check_collision(1, 0):
+            self.x += 1
+
+    def move_down(self):
+        if not self.check_collision(0, 1):
+            self.y += 1
+        else:
+            self.place_piece()
+            self.current_piece = self.next_piece
+            self.next_piece = Shapes.new_piece(self.rng)
+            self.x = COLUMNS // 2 - len(self.current_piece[0]) // 2
+            self.y = 0
+            if self.check_collision(0, 0):
+                self.game_over = True
+
+    def fall(self, rows):
+        # Gravity of several rows is that many move_down steps, stopping once the piece locks
+        for _ in range(rows):
+            if self.check_collision(0, 1):
+                self.move_down()
+                return
+            self.move_down()
+
+
+class Score:
+    def __init__(self):
+        self.score = 0
+        self.streak = 0
+        self.level = 1
+        self.lines_cleared = 0
+
+    def add_placement(self):
+        self.score += 10
+
+    def add_score(self, lines_cleared):
+        if lines_cleared > 0:
+            self.lines_cleared += lines_cleared
+            self.level = self.lines_cleared // 10 + 1
+
+            bonus = 0
+            if self.streak > 0:
+                bonus = 50 * lines_cleared
+
+            if lines_cleared == 1:
+                self.score += 100 * self.level
+            elif lines_cleared == 2:
+                self.score += 300 * self.level
+            elif lines_cleared == 3:
+                self.score += 500 * self.level
+            elif lines_cleared >= 4:
+                self.score += 800 * self.level
+
+            self.score += bonus
+            self.streak += 1
+        else:
+            self.streak = 0
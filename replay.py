@@ -0,0 +1,70 @@
+import json
+
+# One character per input, so a whole piece is a short string like "CCLLH"
+INPUT_CODES = {
+    "left": "L",
+    "right": "R",
+    "rotate": "C",
+    "down": "D",
+    "drop": "H",
+}
+INPUT_NAMES = {code: name for name, code in INPUT_CODES.items()}
+INPUT_METHODS = {
+    "L": "move_left",
+    "R": "move_right",
+    "C": "rotate_piece",
+    "D": "move_down",
+    "H": "drop",
+}
+
+
+class Replay:
+    # A game is fully described by the seed of its piece generator and the inputs
+    # given to each piece (every piece ends with a hard drop)
+    def __init__(self, seed, moves=None, score=0, lines=0):
+        self.seed = seed
+        self.moves = moves if moves is not None else []
+        self.score = score
+        self.lines = lines
+
+    def record(self, inputs):
+        self.moves.append("".join(INPUT_CODES[name] for name in inputs))
+
+    def to_dict(self):
+        return {"seed": self.seed, "score": self.score, "lines": self.lines, "moves": self.moves}
+
+    @staticmethod
+    def from_dict(data):
+        return Replay(data["seed"], data["moves"], data.get("score", 0), data.get("lines", 0))
+
+
+def load_replays(path):
+    # Replays are stored one JSON object per line
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield Replay.from_dict(json.loads(line))
+
+
+def save_replays(path, replays):
+    with open(path, "w") as f:
+        for replay in replays:
+            f.write(json.dumps(replay.to_dict()) + "\n")
+
+
+class ReplayPlayer:
+    # Plays back a recorded game through the same play() interface as the bots
+    def __init__(self, replay):
+        self.replay = replay
+        self.index = 0
+
+    def finished(self):
+        return self.index >= len(self.replay.moves)
+
+    def play(self, tetris, budget=0):
+        if self.finished():
+            tetris.game_over = True
+            return
+        for code in self.replay.moves[self.index]:
+            getattr(tetris, INPUT_METHODS[code])()
+        self.index += 1
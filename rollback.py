@@ -0,0 +1,169 @@
+import random
+import time
+from collections import deque
+
+from Petris_1 import GRAVITY_ONE, GRAVITY_SHIFT, GRAVITY_TABLE, MAX_GRAVITY, GameField, Score, Tetris, speed_level
+from replay import INPUT_METHODS
+
+# GGPO-style rollback for online play. Every peer runs the whole match locally as a
+# deterministic function of (seed, inputs per frame). Local input is applied at once,
+# remote input is predicted as "no input". When the real remote input for an earlier
+# frame arrives and differs from the prediction, the session restores the snapshot
+# taken before that frame and re-simulates up to the current frame.
+#
+# Frames are integer ticks and gravity uses the fixed-point level table, so nothing in
+# the simulation depends on wall-clock time.
+
+NO_INPUT = ""
+
+
+def step(tetris, gravity_accumulator, codes):
+    # One deterministic frame for one player; returns the new gravity accumulator
+    for code in codes:
+        if tetris.game_over:
+            return gravity_accumulator
+        getattr(tetris, INPUT_METHODS[code])()
+    if tetris.game_over:
+        return gravity_accumulator
+    level = speed_level(tetris.score.score)
+    gravity = GRAVITY_TABLE[min(level, len(GRAVITY_TABLE) - 1)]
+    if gravity >= MAX_GRAVITY:
+        # Top speed is an instant drop on fields of any height, as in Game.apply_gravity
+        tetris.fall(tetris.game_field.rows)
+        return gravity_accumulator
+    gravity_accumulator += gravity
+    rows = gravity_accumulator >> GRAVITY_SHIFT
+    if rows:
+        tetris.fall(rows)
+    return gravity_accumulator & (GRAVITY_ONE - 1)
+
+
+class RollbackSession:
+    def __init__(self, seed, local_player, players, transport, max_rollback=8):
+        self.local_player = local_player
+        self.transport = transport
+        self.max_rollback = max_rollback
+        self.games = [Tetris(GameField(), Score(), random.Random(seed)) for _ in range(players)]
+        self.gravity = [0] * players
+        self.frame = 0
+        # Confirmed inputs per player and frame, and what was assumed for frames not yet confirmed
+        self.inputs = [{} for _ in range(players)]
+        self.predicted = [{} for _ in range(players)]
+        self.confirmed_frame = [-1] * players
+        self.snapshots = deque(maxlen=max_rollback + 2)
+        self.rollbacks = 0
+        self.resimulated_frames = 0
+
+    def snapshot(self):
+        return self.frame, [game.snapshot() for game in self.games], self.gravity[:]
+
+    def restore(self, frame):
+        # Snapshots from this frame on are stale; re-simulating records them again
+        while self.snapshots:
+            saved_frame, games, gravity = self.snapshots.pop()
+            if saved_frame == frame:
+                for game, state in zip(self.games, games):
+                    game.restore(state)
+                self.gravity = gravity[:]
+                self.frame = frame
+                return
+        raise RuntimeError(f"No snapshot for frame {frame}, rollback window exceeded")
+
+    def input_for(self, player, frame):
+        codes = self.inputs[player].get(frame)
+        if codes is None:
+            codes = NO_INPUT
+            self.predicted[player][frame] = codes
+        return codes
+
+    def simulate_frame(self):
+        # Snapshot the state before the frame, then run it for every player
+        self.snapshots.append(self.snapshot())
+        for player, game in enumerate(self.games):
+            self.gravity[player] = step(game, self.gravity[player], self.input_for(player, self.frame))
+        self.frame += 1
+
+    def receive(self):
+        # Apply remote inputs; returns the earliest frame that was mispredicted, if any
+        rollback_frame = None
+        for player, frame, codes in self.transport.receive():
+            self.inputs[player][frame] = codes
+            # Confirmed means every frame up to this one is known (messages can arrive out of order)
+            while self.confirmed_frame[player] + 1 in self.inputs[player]:
+                self.confirmed_frame[player] += 1
+            predicted = self.predicted[player].pop(frame, None)
+            if predicted is not None and predicted != codes:
+                if rollback_frame is None or frame < rollback_frame:
+                    rollback_frame = frame
+        return rollback_frame
+
+    def can_advance(self):
+        # Stall instead of predicting further ahead than the rollback window allows
+        oldest = min(self.confirmed_frame[player] for player in range(len(self.games))
+                     if player != self.local_player) if len(self.games) > 1 else self.frame
+        return self.frame - oldest <= self.max_rollback
+
+    def synchronize(self):
+        # Take in remote inputs and re-simulate from the first mispredicted frame
+        rollback_frame = self.receive()
+        if rollback_frame is not None and rollback_frame < self.frame:
+            current = self.frame
+            self.restore(rollback_frame)
+            self.rollbacks += 1
+            while self.frame < current:
+                self.resimulated_frames += 1
+                self.simulate_frame()
+
+    def advance(self, local_codes=NO_INPUT):
+        # Run one frame with the local input. Returns False (and does not advance) while
+        # waiting for remote input that is too far behind.
+        self.synchronize()
+        if not self.can_advance():
+            return False
+
+        self.inputs[self.local_player][self.frame] = local_codes
+        self.confirmed_frame[self.local_player] = self.frame
+        self.transport.send((self.local_player, self.frame, local_codes))
+        self.simulate_frame()
+        self.forget(self.frame - self.max_rollback - 2)
+        return True
+
+    def forget(self, frame):
+        # Inputs older than the rollback window are never needed again
+        for inputs, predicted in zip(self.inputs, self.predicted):
+            inputs.pop(frame, None)
+            predicted.pop(frame, None)
+
+    def checksum(self):
+        # Compare between peers once all inputs up to the current frame are confirmed
+        return tuple((game.game_field.hash, game.score.score, game.x, game.y) for game in self.games)
+
+
+class LoopbackTransport:
+    # In-process transport with simulated one-way latency and jitter, for tests
+    def __init__(self, latency=0.05, jitter=0.0, clock=time.monotonic, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.peers = []
+        self.queue = []
+
+    @staticmethod
+    def pair(latency=0.05, jitter=0.0, clock=time.monotonic):
+        first = LoopbackTransport(latency, jitter, clock, seed=1)
+        second = LoopbackTransport(latency, jitter, clock, seed=2)
+        first.peers.append(second)
+        second.peers.append(first)
+        return first, second
+
+    def send(self, message):
+        for peer in self.peers:
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            peer.queue.append((self.clock() + delay, message))
+
+    def receive(self):
+        now = self.clock()
+        ready = [message for deliver_at, message in self.queue if deliver_at <= now]
+        self.queue = [(deliver_at, message) for deliver_at, message in self.queue if deliver_at > now]
+        return ready
@@ -0,0 +1,194 @@
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# Score history: every finished game in a local SQLite database.
+#
+# The database runs in WAL mode, so the leaderboard screens read while the writer
+# thread commits. Inserts are queued by the game loop and written in batches, one
+# transaction per batch. Each leaderboard (overall, per player, per day, per ruleset)
+# has an index ordered by score, and pages are fetched with keyset pagination:
+# each page starts after the (score, id) of the last row of the previous page, so
+# opening any page is one short index range scan however many games are stored.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    score INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    pieces INTEGER NOT NULL,
+    seed INTEGER,
+    replay TEXT,
+    player TEXT NOT NULL,
+    ruleset TEXT NOT NULL,
+    played_at REAL NOT NULL,
+    day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_score ON games (score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS games_player_score ON games (player, score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS games_day_score ON games (day, score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS games_ruleset_score ON games (ruleset, score DESC, id DESC);
+"""
+
+COLUMNS = ("score", "lines", "level", "duration", "pieces", "seed", "replay",
+           "player", "ruleset", "played_at", "day")
+FILTERS = ("player", "day", "ruleset")
+
+GameRecord = namedtuple("GameRecord", ("id",) + COLUMNS)
+
+
+class ScoreHistory:
+    def __init__(self, path="scores.db", batch_size=64, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Read connection for the game loop; the writer thread opens its own
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.writer, name="score-history-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, score, lines, level, duration, pieces, seed=None, replay=None,
+               player="player", ruleset="10x20", played_at=None):
+        # Called from the game loop; only queues the row
+        if played_at is None:
+            played_at = time.time()
+        day = time.strftime("%Y-%m-%d", time.localtime(played_at))
+        self.queue.put((score, lines, level, duration, pieces, seed, replay, player, ruleset, played_at, day))
+
+    def attach(self, game, player="player"):
+        # Record the game when it ends, with the pieces it placed and its duration.
+        # Autoplay games are not the player's and are not recorded.
+        if game.autoplay is not None:
+            return
+        pieces = [0]
+        started = time.time()
+
+        def on_lock(tetris, lines_cleared):
+            pieces[0] += 1
+
+        def on_game_over(game):
+            field = game.game_field
+            score = game.score
+            self.record(score.score, score.lines_cleared, score.level, time.time() - started, pieces[0],
+                        seed=game.seed, player=player, ruleset=f"{field.columns}x{field.rows}")
+
+        game.tetris.add_hook("on_lock", on_lock)
+        game.add_hook("on_game_over", on_game_over)
+
+    def writer(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        insert = f"INSERT INTO games ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Take whatever else is waiting, up to a batch
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                if batch:
+                    with connection:
+                        connection.executemany(insert, batch)
+            except sqlite3.Error as error:
+                # E.g. the database stayed locked; the thread keeps serving flush() and close()
+                print(f"score history: {len(batch)} game(s) not saved: {error}", file=sys.stderr)
+            finally:
+                for _ in range(len(batch) + stopping):
+                    self.queue.task_done()
+        connection.close()
+
+    def flush(self):
+        # Block until every queued game is committed
+        self.queue.join()
+
+    def top(self, limit=10, after=None, player=None, day=None, ruleset=None):
+        # One page of the leaderboard, best first. after is the (score, id) of the last
+        # row of the previous page.
+        where = []
+        parameters = []
+        for name, value in zip(FILTERS, (player, day, ruleset)):
+            if value is not None:
+                where.append(f"{name} = ?")
+                parameters.append(value)
+        if after is not None:
+            # A row value comparison, so SQLite seeks into the index instead of scanning it
+            where.append("(score, id) < (?, ?)")
+            parameters.extend(after)
+        sql = f"SELECT id, {', '.join(COLUMNS)} FROM games"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY score DESC, id DESC LIMIT ?"
+        parameters.append(limit)
+        return [GameRecord(*row) for row in self.connection.execute(sql, parameters)]
+
+    def best(self, **filters):
+        rows = self.top(1, **filters)
+        return rows[0].score if rows else 0
+
+    def count(self, **filters):
+        names = [name for name in FILTERS if filters.get(name) is not None]
+        sql = "SELECT COUNT(*) FROM games"
+        if names:
+            sql += " WHERE " + " AND ".join(f"{name} = ?" for name in names)
+        return self.connection.execute(sql, [filters[name] for name in names]).fetchone()[0]
+
+    def pages(self, page_size=10, **filters):
+        return ScorePages(self, page_size, **filters)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.connection.close()
+
+
+class ScorePages:
+    # Leaderboard browsing for the high score screens. Remembers the cursor of every
+    # page it has shown, so going back is as cheap as going forward.
+    def __init__(self, history, page_size=10, **filters):
+        self.history = history
+        self.page_size = page_size
+        self.filters = filters
+        self.cursors = [None]
+        self.rows = history.top(page_size, **filters)
+
+    def page(self):
+        return len(self.cursors)
+
+    def next(self):
+        if len(self.rows) < self.page_size:
+            return False
+        cursor = (self.rows[-1].score, self.rows[-1].id)
+        rows = self.history.top(self.page_size, cursor, **self.filters)
+        if not rows:
+            return False
+        self.cursors.append(cursor)
+        self.rows = rows
+        return True
+
+    def previous(self):
+        if len(self.cursors) == 1:
+            return False
+        self.cursors.pop()
+        self.rows = self.history.top(self.page_size, self.cursors[-1], **self.filters)
+        return True
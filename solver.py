@@ -0,0 +1,356 @@
+import argparse
+import heapq
+import json
+import random
+import sys
+import time
+from array import array
+
+from bot import BUMPINESS_WEIGHT, HEIGHT_WEIGHT, HOLES_WEIGHT, INPUT_METHODS, rotations, spawn_x
+from Petris_1 import COLUMNS, ROWS, Colors, GameField, Score, Shapes, Tetris, shape_profile
+from replay import Replay
+
+# Offline puzzle solver: the placements for a known piece sequence that score the most
+# (or clear the most lines) under the Score rules, found by beam search.
+#
+#   python solver.py --seed 7 --pieces 300 --width 64 --output best.jsonl
+#   python solver.py --sequence TOSLJZI --board puzzle.txt --objective lines
+#
+# Placements are the moves of bot.drop_placements: rotate at the spawn position, shift
+# along the top rows, drop. Only placements whose rotations and shifts are all free on
+# the current board are expanded, so every solution plays back in the real engine
+# (play_back checks that for seeded games). A board is only its row
+# masks, heights and hole count, updated incrementally per placement. Every layer of
+# the beam keeps one candidate per equivalent position (same masks and the parts of
+# the score state that change future points) and ranks candidates by points plus the
+# bot heuristic of the board, so the beam does not greedily bury itself.
+#
+# memory caps the candidates held while a layer is expanded: when there are too many
+# they are cut back to the best width, which cannot drop one that would have made the
+# final top width.
+
+PIECE_LETTERS = "TOSLJZI"  # In the order of Shapes.SHAPES
+OBJECTIVES = ("score", "lines")
+CANDIDATE_BYTES = 400  # Rough size of a candidate, before its per row and per column ints
+
+
+def piece_sequence(seed, count):
+    # The shapes a Tetris game seeded with seed deals, in order
+    rng = random.Random(seed)
+    return [Shapes.new_piece(rng)[0] for _ in range(count)]
+
+
+def parse_sequence(letters):
+    return [Shapes.SHAPES[PIECE_LETTERS.index(letter)] for letter in letters.upper()]
+
+
+def parse_board(text):
+    # One line per row, top first: "." for an empty cell, anything else is filled
+    lines = [line.rstrip("\n") for line in text.splitlines() if line.strip()]
+    return [[Colors.BLACK if cell == "." else Colors.WHITE for cell in line] for line in lines]
+
+
+def board_masks(board):
+    return tuple(sum(1 << j for j, color in enumerate(row) if color != Colors.BLACK) for row in board)
+
+
+def surface(masks, columns):
+    # (heights, holes) of a board given as row masks
+    rows = len(masks)
+    heights = [0] * columns
+    seen = 0
+    filled = 0
+    for i, mask in enumerate(masks):
+        filled += mask.bit_count()
+        new = mask & ~seen
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = rows - i
+            new ^= low
+        seen |= mask
+    return heights, sum(heights) - filled
+
+
+def piece_rotations(shape):
+    # (profile rows, top and bottom filled row per column, width, first and one past the
+    # last filled column) of every rotation
+    result = []
+    for rotated in rotations(shape):
+        profile, left, right = shape_profile(rotated)
+        columns = []
+        for j in range(len(rotated[0])):
+            filled = [i for i in range(len(rotated)) if rotated[i][j]]
+            columns.append((filled[0], filled[-1]))
+        result.append((profile, columns, len(rotated[0]), left, right))
+    return result
+
+
+def fits(masks, placement, x, columns):
+    # Same rules as Tetris.check_collision for a piece at the top of the board
+    profile, _, _, left, right = placement
+    if x + left < 0 or x + right > columns:
+        return False
+    for i, mask in profile:
+        if masks[i] & (mask << x):
+            return False
+    return True
+
+
+def reachable_columns(masks, placements, rotation, start, columns):
+    # (first, last) x the piece can be shifted to after rotating rotation times at
+    # start, or None when a rotation is blocked
+    if not any(masks[:4]):
+        # Nothing in the rows a piece passes through at the top: only the walls count
+        for r in range(1, rotation + 1):
+            _, _, _, left, right = placements[r]
+            if start + left < 0 or start + right > columns:
+                return None
+        _, _, _, left, right = placements[rotation]
+        return -left, columns - right
+    for r in range(1, rotation + 1):
+        if not fits(masks, placements[r], start, columns):
+            return None
+    placement = placements[rotation]
+    first = last = start
+    while fits(masks, placement, first - 1, columns):
+        first -= 1
+    while fits(masks, placement, last + 1, columns):
+        last += 1
+    return first, last
+
+
+def play_back(solution, seed, board=None, columns=COLUMNS, rows=ROWS):
+    # Plays the inputs of a solution for seeded pieces through the engine; returns
+    # (score, lines) as the game counts them
+    field = GameField.from_board(board) if board is not None else GameField(columns, rows)
+    tetris = Tetris(field, Score(), random.Random(seed))
+    for inputs in solution.inputs(field.columns):
+        if tetris.game_over:
+            break
+        for name in inputs:
+            getattr(tetris, INPUT_METHODS[name])()
+    return tetris.score.score, tetris.score.lines_cleared
+
+
+class Solution:
+    def __init__(self, placements, pieces, score, lines, level, seconds):
+        self.placements = placements  # (rotation, x) per piece, shorter if the game ended
+        self.pieces = pieces
+        self.score = score
+        self.lines = lines
+        self.level = level
+        self.seconds = seconds
+
+    def inputs(self, columns=COLUMNS):
+        # The moves of each placement, as bot.drop_placements plays them
+        for (rotation, x), shape in zip(self.placements, self.pieces):
+            start = spawn_x(shape, columns)
+            shift = ["right"] * (x - start) if x > start else ["left"] * (start - x)
+            yield ["rotate"] * rotation + shift + ["drop"]
+
+    def replay(self, seed, columns=COLUMNS):
+        replay = Replay(seed, score=self.score, lines=self.lines)
+        for inputs in self.inputs(columns):
+            replay.record(inputs)
+        return replay
+
+
+class BeamSolver:
+    def __init__(self, width=64, objective="score", board_weight=4.0, memory=256):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        self.width = width
+        self.objective = objective
+        self.board_weight = board_weight
+        self.memory = memory  # MiB
+        self.scratch = Score()
+
+    def scored(self, state, lines):
+        # The Score rules applied to a (score, streak, level, lines) state
+        score = self.scratch
+        score.score, score.streak, score.level, score.lines_cleared = state
+        score.add_placement()
+        score.add_score(lines)
+        return score.score, score.streak, score.level, score.lines_cleared
+
+    def points(self, state):
+        # Objective in score units, so it weighs the same against the board heuristic
+        return state[0] if self.objective == "score" else 100 * state[3]
+
+    def key(self, masks, state):
+        # Positions that can still earn the same points from here on
+        if self.objective == "lines":
+            return masks
+        return masks, state[1] > 0, state[3]
+
+    def solve(self, pieces, board=None, columns=COLUMNS, rows=ROWS):
+        start_time = time.perf_counter()
+        if board is not None:
+            columns, rows = len(board[0]), len(board)
+            masks = board_masks(board)
+        else:
+            masks = (0,) * rows
+        full = (1 << columns) - 1
+        heights, holes = surface(masks, columns)
+
+        history_bytes = self.width * len(pieces) * 8  # parent, rotation and x per beam slot
+        budget = self.memory * 2 ** 20 - history_bytes
+        limit = budget // (CANDIDATE_BYTES + 40 * (rows + columns))
+        if limit < self.width:
+            raise ValueError(f"A beam of {self.width} over {len(pieces)} pieces needs more than "
+                             f"{self.memory} MiB")
+
+        # Beam entries: (rank, masks, heights, holes, state, parent, rotation, x)
+        beam = [(0, masks, tuple(heights), holes, (0, 0, 1, 0), 0, 0, 0)]
+        layers = []
+        # (points, layer, index, state) of the best game, finished or not. Ties go to the
+        # deepest layer, so the placements cover as much of the sequence as possible.
+        best = None
+        by_shape = {}
+
+        for depth, shape in enumerate(pieces):
+            placements = by_shape.get(id(shape))
+            if placements is None:
+                placements = by_shape[id(shape)] = piece_rotations(shape)
+            spawn = spawn_x(shape, columns)
+            spawn_profile = placements[0]
+            candidates = {}
+
+            for parent, (_, masks, heights, holes, state, _, _, _) in enumerate(beam):
+                # The game is over when this piece collides where it spawns
+                if depth > 0 and any(masks[i] & (mask << spawn) for i, mask in spawn_profile[0]):
+                    points = self.points(state)
+                    if best is None or (points, depth - 1) > best[:2]:
+                        best = (points, depth - 1, parent, state)
+                    continue
+
+                for rotation, (profile, piece_columns, _, _, _) in enumerate(placements):
+                    reach = reachable_columns(masks, placements, rotation, spawn, columns)
+                    if reach is None:
+                        continue
+                    for x in range(reach[0], reach[1] + 1):
+                        # Straight drop: the piece stops on the skyline
+                        y = rows
+                        for j, (top, bottom) in enumerate(piece_columns):
+                            landing = rows - heights[x + j] - bottom - 1
+                            if landing < y:
+                                y = landing
+                        if y < 0:
+                            continue
+
+                        after = list(masks)
+                        cleared = 0
+                        for i, mask in profile:
+                            after[y + i] |= mask << x
+                            if after[y + i] == full:
+                                cleared += 1
+                        if cleared:
+                            after = [0] * cleared + [mask for mask in after if mask != full]
+                            after_heights, after_holes = surface(after, columns)
+                        else:
+                            after_heights = list(heights)
+                            after_holes = holes
+                            for j, (top, bottom) in enumerate(piece_columns):
+                                after_holes += rows - heights[x + j] - (y + bottom) - 1
+                                after_heights[x + j] = rows - y - top
+                        after = tuple(after)
+                        after_state = self.scored(state, cleared)
+
+                        bumpiness = 0
+                        for j in range(columns - 1):
+                            bumpiness += abs(after_heights[j] - after_heights[j + 1])
+                        rank = self.points(after_state) + self.board_weight * (
+                            HEIGHT_WEIGHT * sum(after_heights) + HOLES_WEIGHT * after_holes
+                            + BUMPINESS_WEIGHT * bumpiness)
+
+                        key = self.key(after, after_state)
+                        known = candidates.get(key)
+                        if known is None or rank > known[0]:
+                            candidates[key] = (rank, after, tuple(after_heights), after_holes,
+                                               after_state, parent, rotation, x)
+                            if len(candidates) > limit:
+                                kept = heapq.nlargest(self.width, candidates.values(), key=lambda c: c[0])
+                                candidates = {self.key(c[1], c[4]): c for c in kept}
+
+            if not candidates:
+                break
+            beam = heapq.nlargest(self.width, candidates.values(), key=lambda c: c[0])
+            layers.append((array("I", (c[5] for c in beam)), array("B", (c[6] for c in beam)),
+                           array("B", (c[7] for c in beam))))
+            for index, candidate in enumerate(beam):
+                points = self.points(candidate[4])
+                if best is None or (points, depth) > best[:2]:
+                    best = (points, depth, index, candidate[4])
+
+        # Walk the parents back from the best game
+        placements = []
+        if best is not None:
+            _, depth, index, state = best
+            for parents, layer_rotations, layer_xs in reversed(layers[:depth + 1]):
+                placements.append((layer_rotations[index], layer_xs[index]))
+                index = parents[index]
+            placements.reverse()
+        else:
+            state = (0, 0, 1, 0)
+        score, streak, level, lines = state
+        return Solution(placements, pieces[:len(placements)], score, lines, level,
+                        time.perf_counter() - start_time)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the best placements for a known piece sequence")
+    parser.add_argument("--seed", type=int, help="solve the pieces a game with this seed deals")
+    parser.add_argument("--pieces", type=int, default=200, help="number of pieces with --seed")
+    parser.add_argument("--sequence", help=f"piece letters ({PIECE_LETTERS}) instead of --seed")
+    parser.add_argument("--board", help="starting board file: one line per row, '.' for empty")
+    parser.add_argument("--columns", type=int, default=COLUMNS, help="board width without --board")
+    parser.add_argument("--rows", type=int, default=ROWS, help="board height without --board")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="score")
+    parser.add_argument("--width", type=int, default=64, help="beam width")
+    parser.add_argument("--board-weight", type=float, default=4.0, help="weight of the board heuristic")
+    parser.add_argument("--memory", type=int, default=256, help="memory cap of the search in MiB")
+    parser.add_argument("--output", help="save the solution as a replay JSONL file (with --seed)")
+    args = parser.parse_args(argv)
+
+    if args.sequence:
+        pieces = parse_sequence(args.sequence)
+    elif args.seed is not None:
+        pieces = piece_sequence(args.seed, args.pieces)
+    else:
+        parser.error("give --seed or --sequence")
+    board = None
+    if args.board:
+        with open(args.board, "r") as f:
+            board = parse_board(f.read())
+
+    solver = BeamSolver(args.width, args.objective, args.board_weight, args.memory)
+    solution = solver.solve(pieces, board, args.columns, args.rows)
+    columns = len(board[0]) if board is not None else args.columns
+    print(json.dumps({
+        "score": solution.score,
+        "lines": solution.lines,
+        "level": solution.level,
+        "pieces": len(solution.placements),
+        "of": len(pieces),
+        "seconds": round(solution.seconds, 3),
+        "placements": [[rotation, x] for rotation, x in solution.placements],
+    }))
+
+    if args.seed is not None:
+        played = play_back(solution, args.seed, board, args.columns, args.rows)
+        if played != (solution.score, solution.lines):
+            print(f"Playing the solution back scored {played[0]} with {played[1]} lines, "
+                  f"not {solution.score} with {solution.lines}", file=sys.stderr)
+            return 1
+
+    if args.output:
+        if args.seed is None or board is not None:
+            print("--output needs --seed and an empty board, which a replay starts from", file=sys.stderr)
+            return 1
+        with open(args.output, "w") as f:
+            f.write(json.dumps(solution.replay(args.seed, columns).to_dict()) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from Petris_1 import GRAVITY_ONE, Shapes
+
+
+class Telemetry:
+    # Collects game events in a bounded in-memory buffer. A background thread drains
+    # it to a JSONL file, so the game loop never waits on encoding or disk I/O.
+    # When the buffer is full the oldest events are overwritten and counted as dropped.
+    # The file is rotated like logging's RotatingFileHandler (path.1, path.2, ...).
+    def __init__(self, path="telemetry.jsonl", capacity=8192, flush_interval=1.0,
+                 max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer = deque(maxlen=capacity)
+        self.session = uuid.uuid4().hex
+        self.game = 0
+        self.emitted = 0
+        self.written = 0
+        self.wake = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.stopping = False
+        self.thread = None
+        self.file = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.writer, name="telemetry-writer", daemon=True)
+        self.thread.start()
+
+    async def writer_task(self):
+        # Alternative to start() for the asyncio application loop: flushes are scheduled
+        # as tasks between frames instead of running on a dedicated thread
+        while not self.stopping:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def new_game(self):
+        self.game += 1
+        self.emit("game_start")
+
+    def attach(self, game):
+        # Subscribe to the hooks of a Game and its Tetris and Score
+        self.new_game()
+        game.tetris.add_hook("on_spawn", self.on_spawn)
+        game.tetris.add_hook("on_lock", self.on_lock)
+        game.tetris.add_hook("on_move", self.on_move)
+        game.tetris.add_hook("on_rotate", self.on_rotate)
+        game.score.add_hook("on_clear", self.on_clear)
+        game.score.add_hook("on_level_up", self.on_level_up)
+        game.add_hook("on_speed_change", self.on_speed_change)
+        game.add_hook("on_game_over", self.on_game_over)
+
+    def on_spawn(self, tetris):
+        self.emit("piece_spawned", piece=Shapes.SHAPES.index(tetris.current_piece[0]))
+
+    def on_lock(self, tetris, lines_cleared):
+        self.emit("piece_placed", x=tetris.x, y=tetris.y, lines=lines_cleared)
+
+    def on_move(self, tetris, dx, dy):
+        self.emit("move", dx=dx, dy=dy)
+
+    def on_rotate(self, tetris):
+        self.emit("rotate")
+
+    def on_clear(self, score, lines_cleared, bonus):
+        self.emit("lines_cleared", count=lines_cleared, bonus=bonus, streak=score.streak, score=score.score)
+
+    def on_level_up(self, score, level):
+        self.emit("level_change", level=level)
+
+    def on_speed_change(self, game, speed_level):
+        self.emit("speed_change", speed_level=speed_level, cells_per_tick=game.gravity / GRAVITY_ONE)
+
+    def on_game_over(self, game):
+        self.emit("game_over", score=game.score.score, lines=game.score.lines_cleared,
+                  level=game.score.level, ticks=game.ticks)
+
+    def emit(self, kind, **fields):
+        # Called from the game loop: only a tuple is appended, everything else happens in the writer
+        self.buffer.append((time.time(), self.game, kind, fields))
+        self.emitted += 1
+
+    def dropped(self):
+        return self.emitted - self.written - len(self.buffer)
+
+    def writer(self):
+        while not self.stopping:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            self.flush_buffer()
+
+    def flush_buffer(self):
+        if not self.buffer:
+            return
+        lines = []
+        while self.buffer:
+            try:
+                timestamp, game, kind, fields = self.buffer.popleft()
+            except IndexError:
+                break
+            record = {"t": round(timestamp, 4), "session": self.session, "game": game, "event": kind}
+            record.update(fields)
+            lines.append(json.dumps(record))
+        if self.file is None:
+            self.file = open(self.path, "a")
+        self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
+        self.written += len(lines)
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        self.file = None
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self):
+        self.stopping = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        else:
+            self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    async def close_async(self):
+        self.stopping = True
+        await asyncio.to_thread(self.close)
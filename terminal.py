@@ -0,0 +1,228 @@
+import curses
+import sys
+import time
+
+from Petris_1 import ROWS, FPS, Colors, Game, HighScore
+
+# Terminal front end for headless servers (play, watch bots or debug over SSH):
+#
+#   python terminal.py              play
+#   python terminal.py --autoplay   watch the expectimax bot
+#
+# It drives the same Game/Tetris/Score state as the pygame window and only writes
+# the board cells and labels that changed since the previous frame.
+
+CELL_WIDTH = 2
+BOARD_TOP = 1
+BOARD_LEFT = 2
+PANEL_GAP = 4
+
+KEY_ACTIONS = {
+    curses.KEY_LEFT: "move_left",
+    curses.KEY_RIGHT: "move_right",
+    curses.KEY_DOWN: "move_down",
+    curses.KEY_UP: "rotate_piece",
+    ord(" "): "drop",
+}
+
+
+class CursesRenderer:
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        curses.curs_set(0)
+        stdscr.nodelay(True)
+        stdscr.keypad(True)
+        curses.start_color()
+        self.pairs = {}
+        self.cells = {}
+        self.labels = {}
+        orange = 208 if curses.COLORS >= 256 else curses.COLOR_YELLOW
+        self.palette = {
+            Colors.BLACK: curses.COLOR_BLACK,
+            Colors.WHITE: curses.COLOR_WHITE,
+            Colors.CYAN: curses.COLOR_CYAN,
+            Colors.BLUE: curses.COLOR_BLUE,
+            Colors.ORANGE: orange,
+            Colors.YELLOW: curses.COLOR_YELLOW,
+            Colors.GREEN: curses.COLOR_GREEN,
+            Colors.PURPLE: curses.COLOR_MAGENTA,
+            Colors.RED: curses.COLOR_RED,
+            Colors.LIGHT_GRAY: curses.COLOR_WHITE,
+        }
+
+    def attr(self, color):
+        # One color pair per block color, created on first use
+        pair = self.pairs.get(color)
+        if pair is None:
+            pair = len(self.pairs) + 1
+            background = self.palette.get(color, curses.COLOR_WHITE)
+            curses.init_pair(pair, curses.COLOR_WHITE, background)
+            self.pairs[color] = pair
+        return curses.color_pair(pair)
+
+    def cell(self, y, x, color):
+        attr = self.attr(color)
+        if self.cells.get((y, x)) != attr:
+            self.cells[(y, x)] = attr
+            self.put(y, x, " " * CELL_WIDTH, attr)
+
+    def label(self, y, x, text, attr=curses.A_NORMAL):
+        if self.labels.get((y, x)) != (text, attr):
+            previous = self.labels.get((y, x))
+            if previous is not None and len(previous[0]) > len(text):
+                text = text.ljust(len(previous[0]))
+            self.labels[(y, x)] = (text, attr)
+            self.put(y, x, text, attr)
+
+    def put(self, y, x, text, attr):
+        try:
+            self.stdscr.addstr(y, x, text, attr)
+        except curses.error:
+            pass  # Terminal too small; skip what does not fit
+
+    def clear(self):
+        self.stdscr.erase()
+        self.cells.clear()
+        self.labels.clear()
+
+    def draw_border(self, columns, rows):
+        width = columns * CELL_WIDTH
+        self.label(BOARD_TOP - 1, BOARD_LEFT - 1, "+" + "-" * width + "+")
+        self.label(BOARD_TOP + rows, BOARD_LEFT - 1, "+" + "-" * width + "+")
+        for i in range(rows):
+            self.label(BOARD_TOP + i, BOARD_LEFT - 1, "|")
+            self.label(BOARD_TOP + i, BOARD_LEFT + width, "|")
+
+    def draw_game(self, game):
+        tetris = game.tetris
+        shape, piece_color = tetris.current_piece
+        piece_cells = set()
+        if not tetris.game_over:
+            for i, row in enumerate(shape):
+                for j, filled in enumerate(row):
+                    if filled:
+                        piece_cells.add((tetris.y + i, tetris.x + j))
+
+        field = game.game_field
+        self.draw_border(field.columns, field.rows)
+        for i, row in enumerate(field.board):
+            for j, color in enumerate(row):
+                if (i, j) in piece_cells:
+                    color = piece_color
+                self.cell(BOARD_TOP + i, BOARD_LEFT + j * CELL_WIDTH, color)
+
+        # Next piece preview in a 4x4 box, right of the board
+        panel_left = BOARD_LEFT + field.columns * CELL_WIDTH + PANEL_GAP
+        next_shape, next_color = tetris.next_piece
+        self.label(BOARD_TOP, panel_left, "NEXT:")
+        for i in range(4):
+            for j in range(4):
+                filled = i < len(next_shape) and j < len(next_shape[0]) and next_shape[i][j]
+                self.cell(BOARD_TOP + 2 + i, panel_left + j * CELL_WIDTH,
+                          next_color if filled else Colors.BLACK)
+
+        score = game.score
+        self.label(BOARD_TOP + 7, panel_left, "SCORE")
+        self.label(BOARD_TOP + 8, panel_left, f"{score.score:06d}", curses.A_BOLD)
+        self.label(BOARD_TOP + 10, panel_left, "MULTIPLIER")
+        self.label(BOARD_TOP + 11, panel_left, f"{score.level}")
+        self.label(BOARD_TOP + 13, panel_left, "LINES")
+        self.label(BOARD_TOP + 14, panel_left, f"{score.lines_cleared}")
+        self.label(BOARD_TOP + 16, panel_left, "HIGH SCORE:")
+        self.label(BOARD_TOP + 17, panel_left, f"{game.high_score.high_score:06d}")
+
+    def draw_menu(self, title, options, selected, lines=()):
+        self.label(1, 4, title, curses.A_BOLD)
+        for i, option in enumerate(options):
+            attr = curses.A_REVERSE if i == selected else curses.A_NORMAL
+            self.label(3 + i * 2, 6, f" {option} ", attr)
+        for i, line in enumerate(lines):
+            self.label(4 + len(options) * 2 + i, 4, line)
+        self.label(ROWS, 4, "UP/DOWN - Navigate, ENTER - Select, Q - Back")
+
+
+def menu(stdscr, renderer, title, options, lines=()):
+    renderer.clear()
+    selected = 0
+    while True:
+        renderer.draw_menu(title, options, selected, lines)
+        stdscr.refresh()
+        key = stdscr.getch()
+        if key == curses.KEY_DOWN:
+            selected = (selected + 1) % len(options)
+        elif key == curses.KEY_UP:
+            selected = (selected - 1) % len(options)
+        elif key in (curses.KEY_ENTER, 10, 13):
+            return options[selected]
+        elif key == ord("q"):
+            return None
+        else:
+            time.sleep(1 / 30)
+
+
+def play(stdscr, renderer, game):
+    renderer.clear()
+    frame = 1 / FPS
+    next_frame = time.perf_counter()
+    while not game.tetris.game_over:
+        key = stdscr.getch()
+        while key != -1:
+            if key == ord("q"):
+                game.tetris.game_over = True
+            elif key in KEY_ACTIONS and game.autoplay is None:
+                getattr(game.tetris, KEY_ACTIONS[key])()
+            key = stdscr.getch()
+
+        game.ticks += 1
+        game.apply_gravity()
+        game.update_speed()
+
+        renderer.draw_game(game)
+        stdscr.refresh()
+
+        next_frame += frame
+        delay = next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_frame = time.perf_counter()
+
+    if game.on_game_over is not None:
+        game.on_game_over(game)
+    # Only a person playing sets the high score, as in Game.play
+    new_high_score = game.autoplay is None and game.high_score.update(game.score.score)
+    if new_high_score:
+        game.high_score.write()
+    lines = [f"YOUR SCORE: {game.score.score}"]
+    if new_high_score:
+        lines.append("!!! NEW HIGH SCORE !!!")
+    return menu(stdscr, renderer, "GAME OVER", ["PLAY AGAIN", "MAIN MENU"], lines)
+
+
+def run(stdscr, autoplay=None):
+    renderer = CursesRenderer(stdscr)
+    while True:
+        choice = menu(stdscr, renderer, "PETRIS", ["START GAME", "HIGH SCORES", "QUIT"])
+        if choice in (None, "QUIT"):
+            return
+        if choice == "HIGH SCORES":
+            menu(stdscr, renderer, "HIGH SCORES", ["BACK"], [str(HighScore().high_score)])
+            continue
+        while play(stdscr, renderer, Game(autoplay)) == "PLAY AGAIN":
+            pass
+
+
+def main():
+    autoplay = None
+    if "--autoplay" in sys.argv:
+        from bot import ExpectimaxBot
+        autoplay = ExpectimaxBot()
+    try:
+        curses.wrapper(run, autoplay)
+    finally:
+        if autoplay is not None:
+            autoplay.close()
+
+
+if __name__ == "__main__":
+    main()
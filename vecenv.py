@@ -0,0 +1,245 @@
+import multiprocessing
+import os
+import random
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("vecenv needs NumPy: pip install numpy (see requirements.txt)") from None
+
+from Petris_1 import COLUMNS, ROWS, GameField, Score, Shapes, Tetris
+from rollback import step
+
+# Vectorized environments for reinforcement learning: num_envs games stepped by worker
+# processes, each owning a contiguous slice of the games. Actions, observations,
+# rewards and done flags live in shared memory NumPy arrays that the learner and the
+# workers use in place; the pipes only carry one-word commands.
+#
+#   envs = VecEnv(256, workers=8)
+#   observations = envs.reset()
+#   observations, rewards, dones = envs.step(actions)        synchronous
+#   envs.step_async(actions) ... envs.step_wait()             asynchronous
+#
+# One step is one frame: the input chosen by the action (see ACTIONS), then one frame
+# of gravity, played by rollback.step like every other deterministic frame. The reward
+# is the score gained. A game that ends is reset in the same step: its done flag is
+# set, its observation is already the first frame of the next game and episode_scores
+# holds the final score of the game that ended.
+#
+# The returned arrays are the shared ones and are overwritten by the next step, and
+# they must not be read between step_async and step_wait.
+
+ACTIONS = ("", "L", "R", "C", "D", "H")  # Nothing, left, right, rotate, down, hard drop
+
+# Observation cells
+EMPTY = 0
+LOCKED = 1
+PIECE = 2
+
+# next_pieces holds 1 + the index of the next shape in Shapes.SHAPES. Pieces are the
+# shape lists themselves until they rotate, so the next piece is found by identity.
+PIECE_IDS = {id(shape): i + 1 for i, shape in enumerate(Shapes.SHAPES)}
+
+
+def array_specs(num_envs, columns, rows):
+    return {
+        "observations": ((num_envs, rows, columns), np.uint8),
+        "next_pieces": ((num_envs,), np.int8),
+        "actions": ((num_envs,), np.int8),
+        "rewards": ((num_envs,), np.float32),
+        "dones": ((num_envs,), np.bool_),
+        "episode_scores": ((num_envs,), np.int64),
+    }
+
+
+class SharedArrays:
+    # NumPy arrays in shared memory blocks. The side that creates them unlinks the
+    # blocks when closing; workers attach by block name.
+    def __init__(self, specs, names=None):
+        self.owner = names is None
+        self.blocks = {}
+        self.arrays = {}
+        for field, (shape, dtype) in specs.items():
+            if self.owner:
+                size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=names[field])
+            self.blocks[field] = block
+            self.arrays[field] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def names(self):
+        return {field: block.name for field, block in self.blocks.items()}
+
+    def close(self):
+        self.arrays.clear()
+        for block in self.blocks.values():
+            if self.owner:
+                block.unlink()
+            try:
+                block.close()
+            except BufferError:
+                pass  # A caller still holds a view; the mapping goes away with it
+        self.blocks.clear()
+
+
+class EnvSlice:
+    # The games start..stop, stepped in the process that owns them
+    def __init__(self, arrays, start, stop, seed, columns=COLUMNS, rows=ROWS):
+        self.arrays = arrays
+        self.start = start
+        self.seed = seed
+        self.columns = columns
+        self.rows = rows
+        self.games = [None] * (stop - start)  # [tetris, gravity accumulator]
+        self.episodes = [0] * (stop - start)
+        self.bits = np.arange(columns, dtype=np.uint64)
+
+    def new_game(self, i):
+        # Every game of every environment has its own reproducible piece sequence
+        index = self.start + i
+        rng = random.Random(f"{self.seed}/{index}/{self.episodes[i]}")
+        self.episodes[i] += 1
+        self.games[i] = [Tetris(GameField(self.columns, self.rows), Score(), rng), 0]
+
+    def observe(self, i):
+        index = self.start + i
+        tetris = self.games[i][0]
+        observation = self.arrays["observations"][index]
+        # Row masks to cells: bit j of row r is column j
+        masks = np.array(tetris.game_field.masks, dtype=np.uint64)
+        observation[:] = (masks[:, None] >> self.bits) & 1
+        for r, row in enumerate(tetris.current_piece[0]):
+            y = tetris.y + r
+            for c, filled in enumerate(row):
+                x = tetris.x + c
+                if filled and 0 <= y < self.rows and 0 <= x < self.columns:
+                    observation[y, x] = PIECE
+        self.arrays["next_pieces"][index] = PIECE_IDS.get(id(tetris.next_piece[0]), 0)
+
+    def reset(self):
+        for i in range(len(self.games)):
+            index = self.start + i
+            self.new_game(i)
+            self.arrays["rewards"][index] = 0
+            self.arrays["dones"][index] = False
+            self.observe(i)
+
+    def step(self):
+        actions = self.arrays["actions"]
+        rewards = self.arrays["rewards"]
+        dones = self.arrays["dones"]
+        for i, game in enumerate(self.games):
+            index = self.start + i
+            tetris = game[0]
+            score = tetris.score.score
+            game[1] = step(tetris, game[1], ACTIONS[actions[index]])
+            rewards[index] = tetris.score.score - score
+            dones[index] = tetris.game_over
+            if tetris.game_over:
+                self.arrays["episode_scores"][index] = tetris.score.score
+                self.new_game(i)
+            self.observe(i)
+
+
+def worker(connection, names, specs, start, stop, seed, columns, rows):
+    shared = SharedArrays(specs, names)
+    games = EnvSlice(shared.arrays, start, stop, seed, columns, rows)
+    try:
+        while True:
+            command = connection.recv()
+            if command == "close":
+                break
+            getattr(games, command)()
+            connection.send(command)
+    except (EOFError, KeyboardInterrupt):
+        pass  # The learner went away
+    finally:
+        del games
+        shared.close()
+
+
+class VecEnv:
+    def __init__(self, num_envs, workers=None, seed=0, columns=COLUMNS, rows=ROWS):
+        # workers=0 steps every game in this process, which is handy for debugging
+        if columns > 64:
+            raise ValueError("Observations support boards of at most 64 columns")
+        if workers is None:
+            workers = min(num_envs, os.cpu_count() or 1)
+        self.num_envs = num_envs
+        specs = array_specs(num_envs, columns, rows)
+        self.shared = SharedArrays(specs)
+        arrays = self.shared.arrays
+        self.observations = arrays["observations"]
+        self.next_pieces = arrays["next_pieces"]
+        self.actions = arrays["actions"]
+        self.rewards = arrays["rewards"]
+        self.dones = arrays["dones"]
+        self.episode_scores = arrays["episode_scores"]
+        self.waiting = False
+        self.local = None
+        self.connections = []
+        self.processes = []
+        if workers == 0:
+            self.local = EnvSlice(arrays, 0, num_envs, seed, columns, rows)
+            return
+        bounds = [num_envs * k // workers for k in range(workers + 1)]
+        for start, stop in zip(bounds, bounds[1:]):
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=worker, args=(child, self.shared.names(), specs, start, stop, seed, columns, rows),
+                name=f"vecenv-{start}-{stop}", daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def send(self, command):
+        if self.local is not None:
+            getattr(self.local, command)()
+        for connection in self.connections:
+            connection.send(command)
+
+    def wait(self):
+        for connection in self.connections:
+            connection.recv()
+
+    def reset(self):
+        if self.waiting:
+            self.step_wait()
+        self.send("reset")
+        self.wait()
+        return self.observations
+
+    def step_async(self, actions):
+        if self.waiting:
+            raise RuntimeError("step_async called again before step_wait")
+        self.actions[:] = actions
+        self.send("step")
+        self.waiting = True
+
+    def step_wait(self):
+        self.wait()
+        self.waiting = False
+        return self.observations, self.rewards, self.dones
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.waiting:
+            self.step_wait()
+        for connection in self.connections:
+            connection.send("close")
+        for process in self.processes:
+            process.join()
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+        self.processes = []
+        self.local = None
+        self.observations = self.next_pieces = self.actions = None
+        self.rewards = self.dones = self.episode_scores = None
+        self.shared.close()
@@ -0,0 +1,402 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import deque
+
+import bot
+from Petris_1 import (COLUMNS, ROWS, FPS, GRAVITY_ONE, GRAVITY_SHIFT, GRAVITY_TABLE,
+                      Colors, GameField, Score, Tetris)
+from replay import INPUT_CODES, INPUT_METHODS
+
+# Networked versus mode. The server simulates every match authoritatively; clients
+# only send inputs and receive compact per-tick deltas. All matches share one tick
+# loop, so a single process can host hundreds of them. Queued inputs are capped per
+# player, and a client that stops reading is disconnected rather than buffered for.
+#
+#   python versus.py server --port 7777 --players 2
+#   python versus.py bots --port 7777 --count 2
+#
+# Messages are JSON lines.
+#   client -> server  {"t": "in", "i": "LLCH"}           input codes from replay.INPUT_CODES
+#   server -> client  {"t": "start", "you": 0, "players": 2, "seed": 123}
+#                     {"t": "tick", "n": 42, "d": [[player, delta], ...]}
+#                     {"t": "end", "winner": 1}
+# A delta only has the keys that changed since the last tick:
+#   "r": [[row, bitmask], ...]   changed board rows, bit j set for a filled column j
+#   "p": [piece, x, y, width, [row bitmasks of the shape]]   piece counts spawned pieces
+#   "s": score, "o": 1 when that player is out
+
+# Garbage rows sent to every opponent for a single lock clearing n lines
+GARBAGE = {2: 1, 3: 2, 4: 4}
+MAX_INPUTS_PER_TICK = 32
+MAX_QUEUED_INPUTS = 256  # Inputs beyond this are refused until the queue drains
+# A client whose unsent data passes WRITE_BUFFER_LIMIT bytes must read it within
+# DRAIN_TIMEOUT seconds or it is disconnected
+WRITE_BUFFER_LIMIT = 64 * 1024
+DRAIN_TIMEOUT = 5.0
+
+
+def shape_masks(shape):
+    return [sum(1 << j for j, cell in enumerate(row) if cell) for row in shape]
+
+
+class Player:
+    def __init__(self, match, index, writer, seed):
+        self.match = match
+        self.index = index
+        self.writer = writer
+        self.game_field = GameField()
+        self.score = Score()
+        self.tetris = Tetris(self.game_field, self.score, random.Random(seed))
+        self.tetris.add_hook("on_lock", self.on_lock)
+        self.tetris.add_hook("on_spawn", self.on_spawn)
+        self.inputs = deque()
+        self.draining = None
+        self.gravity_accumulator = 0
+        self.pieces = 1
+        self.incoming_garbage = 0
+        self.sent_hash = 0
+        self.sent_rows = [0] * ROWS
+        self.sent_pose = None
+        self.sent_score = 0
+        self.sent_out = False
+
+    def on_lock(self, tetris, lines_cleared):
+        attack = GARBAGE.get(lines_cleared, 0)
+        if attack:
+            self.match.send_garbage(self, attack)
+
+    def on_spawn(self, tetris):
+        self.pieces += 1
+
+    def queue_inputs(self, codes):
+        room = MAX_QUEUED_INPUTS - len(self.inputs)
+        for code in codes:
+            if room <= 0:
+                break
+            if code in INPUT_METHODS:
+                self.inputs.append(code)
+                room -= 1
+
+    def send(self, data):
+        # The tick loop cannot wait for one slow reader, so a lagging client gets a
+        # drain task of its own
+        writer = self.writer
+        if writer is None or writer.is_closing():
+            return
+        writer.write(data)
+        if self.draining is None and writer.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+            self.draining = asyncio.get_running_loop().create_task(self.drain(writer))
+
+    async def drain(self, writer):
+        try:
+            await asyncio.wait_for(writer.drain(), DRAIN_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.disconnect()
+        self.draining = None
+
+    def disconnect(self):
+        self.tetris.game_over = True
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def step(self, gravity):
+        tetris = self.tetris
+        for _ in range(min(len(self.inputs), MAX_INPUTS_PER_TICK)):
+            if tetris.game_over:
+                break
+            getattr(tetris, INPUT_METHODS[self.inputs.popleft()])()
+
+        if self.incoming_garbage and not tetris.game_over:
+            hole = self.match.rng.randrange(COLUMNS)
+            if not self.game_field.add_garbage(self.incoming_garbage, hole):
+                tetris.game_over = True
+            # Lift the falling piece out of the garbage if there is room
+            while not tetris.game_over and tetris.check_collision(0, 0):
+                if tetris.y == 0:
+                    tetris.game_over = True
+                else:
+                    tetris.y -= 1
+            self.incoming_garbage = 0
+
+        if not tetris.game_over:
+            self.gravity_accumulator += gravity
+            rows = self.gravity_accumulator >> GRAVITY_SHIFT
+            self.gravity_accumulator &= GRAVITY_ONE - 1
+            if rows:
+                tetris.fall(rows)
+
+    def delta(self):
+        # Only what changed since the last broadcast; the board is rescanned only when its hash moved
+        delta = {}
+        field = self.game_field
+        if field.hash != self.sent_hash:
+            rows = []
+            for i in range(ROWS):
+                mask = field.row_mask(i)
+                if mask != self.sent_rows[i]:
+                    self.sent_rows[i] = mask
+                    rows.append([i, mask])
+            self.sent_hash = field.hash
+            if rows:
+                delta["r"] = rows
+        tetris = self.tetris
+        pose = (self.pieces, tetris.x, tetris.y, tetris.current_piece[0])
+        if pose != self.sent_pose:
+            self.sent_pose = pose
+            shape = tetris.current_piece[0]
+            delta["p"] = [self.pieces, tetris.x, tetris.y, len(shape[0]), shape_masks(shape)]
+        if self.score.score != self.sent_score:
+            self.sent_score = self.score.score
+            delta["s"] = self.score.score
+        if tetris.game_over and not self.sent_out:
+            self.sent_out = True
+            delta["o"] = 1
+        return delta
+
+
+class Match:
+    def __init__(self, match_id, size, tick_rate, seed):
+        self.match_id = match_id
+        self.size = size
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.players = []
+        self.tick_count = 0
+        self.gravity = GRAVITY_TABLE[0] * FPS // tick_rate
+        self.finished = False
+
+    def add_player(self, writer):
+        # Every player gets the same piece sequence
+        player = Player(self, len(self.players), writer, self.seed)
+        self.players.append(player)
+        return player
+
+    def ready(self):
+        return len(self.players) == self.size
+
+    def start(self):
+        for player in self.players:
+            player.send(encode({"t": "start", "you": player.index, "players": self.size, "seed": self.seed}))
+
+    def send_garbage(self, sender, count):
+        for player in self.players:
+            if player is not sender and not player.tetris.game_over:
+                player.incoming_garbage += count
+
+    def tick(self):
+        self.tick_count += 1
+        for player in self.players:
+            if not player.tetris.game_over:
+                player.step(self.gravity)
+
+        deltas = []
+        for player in self.players:
+            delta = player.delta()
+            if delta:
+                deltas.append([player.index, delta])
+        if deltas:
+            self.broadcast({"t": "tick", "n": self.tick_count, "d": deltas})
+
+        alive = [player for player in self.players if not player.tetris.game_over]
+        if len(alive) <= (1 if self.size > 1 else 0):
+            winner = alive[0].index if alive else None
+            self.broadcast({"t": "end", "winner": winner})
+            self.finished = True
+
+    def broadcast(self, message):
+        data = encode(message)
+        for player in self.players:
+            player.send(data)
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def send(writer, message):
+    if writer is not None and not writer.is_closing():
+        writer.write(encode(message))
+
+
+class VersusServer:
+    def __init__(self, players_per_match=2, tick_rate=30, seed=None):
+        self.players_per_match = players_per_match
+        self.tick_rate = tick_rate
+        self.rng = random.Random(seed)
+        self.matches = []
+        self.waiting = None
+        self.next_match_id = 1
+        self.server = None
+        self.tick_time = 0.0  # Seconds of CPU spent in the last tick, across all matches
+
+    async def start(self, host="127.0.0.1", port=7777):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle_client(self, reader, writer):
+        if self.waiting is None:
+            self.waiting = Match(self.next_match_id, self.players_per_match,
+                                 self.tick_rate, self.rng.getrandbits(32))
+            self.next_match_id += 1
+        match = self.waiting
+        player = match.add_player(writer)
+        if match.ready():
+            self.waiting = None
+            self.matches.append(match)
+            match.start()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("t") == "in":
+                    player.queue_inputs(message["i"])
+        except (ConnectionError, ValueError, KeyError, TypeError, AttributeError):
+            # Disconnected, or a message that breaks the protocol
+            pass
+        finally:
+            if match is self.waiting:
+                # Left before the match started: free the seat
+                match.players.remove(player)
+                for index, other in enumerate(match.players):
+                    other.index = index
+            player.disconnect()
+            writer.close()
+
+    async def run(self):
+        # One loop ticks every match, so the cost per match is one function call per tick
+        interval = 1 / self.tick_rate
+        next_tick = time.perf_counter()
+        while True:
+            start = time.perf_counter()
+            for match in self.matches:
+                match.tick()
+            self.matches = [match for match in self.matches if not match.finished]
+            self.tick_time = time.perf_counter() - start
+            next_tick += interval
+            await asyncio.sleep(max(0, next_tick - time.perf_counter()))
+
+    async def serve(self, host="127.0.0.1", port=7777):
+        await self.start(host, port)
+        await self.run()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+
+class VersusClient:
+    # Keeps a mirror of every board in the match from the server deltas
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.you = None
+        self.seed = None
+        self.boards = []
+        self.poses = []
+        self.scores = []
+        self.out = []
+        self.winner = None
+        self.finished = False
+        self.bytes_received = 0
+
+    async def connect(self, host="127.0.0.1", port=7777):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    def send_inputs(self, codes):
+        send(self.writer, {"t": "in", "i": codes})
+
+    async def receive(self):
+        line = await self.reader.readline()
+        if not line:
+            self.finished = True
+            return None
+        self.bytes_received += len(line)
+        message = json.loads(line)
+        kind = message["t"]
+        if kind == "start":
+            self.you = message["you"]
+            self.seed = message["seed"]
+            count = message["players"]
+            self.boards = [[0] * ROWS for _ in range(count)]
+            self.poses = [None] * count
+            self.scores = [0] * count
+            self.out = [False] * count
+        elif kind == "tick":
+            for index, delta in message["d"]:
+                for row, mask in delta.get("r", ()):
+                    self.boards[index][row] = mask
+                if "p" in delta:
+                    self.poses[index] = delta["p"]
+                if "s" in delta:
+                    self.scores[index] = delta["s"]
+                if "o" in delta:
+                    self.out[index] = True
+        elif kind == "end":
+            self.winner = message["winner"]
+            self.finished = True
+        return message
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def board_from_masks(masks):
+    board = [[Colors.WHITE if mask >> j & 1 else Colors.BLACK for j in range(COLUMNS)] for mask in masks]
+    return GameField.from_board(board)
+
+
+async def bot_client(host, port, budget=0.005):
+    # Plays a match with the greedy bot, deciding from the mirrored board only
+    player_bot = bot.ExpectimaxBot(depth=1)
+    client = VersusClient()
+    await client.connect(host, port)
+    last_piece = None
+    while not client.finished:
+        message = await client.receive()
+        if message is None or client.you is None or client.out[client.you]:
+            continue
+        pose = client.poses[client.you]
+        if pose is not None and pose[0] != last_piece:
+            last_piece = pose[0]
+            piece, x, y, width, masks = pose
+            shape = [[mask >> j & 1 for j in range(width)] for mask in masks]
+            inputs = player_bot.choose(board_from_masks(client.boards[client.you]), shape, None, budget)
+            client.send_inputs("".join(INPUT_CODES[name] for name in inputs or ["drop"]))
+    client.close()
+    return client
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Petris versus server and test clients")
+    parser.add_argument("mode", choices=["server", "bots"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--players", type=int, default=2, help="players per match")
+    parser.add_argument("--tick-rate", type=int, default=30)
+    parser.add_argument("--count", type=int, default=2, help="number of bot clients to connect")
+    args = parser.parse_args(argv)
+
+    if args.mode == "server":
+        server = VersusServer(args.players, args.tick_rate)
+        asyncio.run(server.serve(args.host, args.port))
+    else:
+        async def run_bots():
+            clients = await asyncio.gather(*(bot_client(args.host, args.port) for _ in range(args.count)))
+            for client in clients:
+                print(f"player {client.you}: score {client.scores[client.you]}, winner {client.winner}, "
+                      f"{client.bytes_received} bytes received")
+        asyncio.run(run_bots())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import math
+import sys
+
+import pygame
+
+import bot
+from Petris_1 import COLUMNS, ROWS, FPS, Colors, FrameClock, Game, NullRenderer
+from replay import ReplayPlayer, load_replays
+
+# Spectator wall: many live games (bots or replays) scaled down into one window.
+#
+#   python wall.py --games 36
+#   python wall.py --replays replays.jsonl
+#
+# Every board remembers the colors it last drew, and a board is only looked at when
+# its state (board hash, piece pose, score) changed this frame. Only the changed cells
+# are blitted from a shared block atlas, and only their rectangles are pushed to the
+# display, so a frame costs what changed rather than the number of boards.
+
+TILE_MARGIN = 1  # Blocks of spacing around each board
+LABEL_HEIGHT = 14
+
+
+class BlockAtlas:
+    # One pre-rendered block per color at the wall's block size, shared by every board
+    def __init__(self, size):
+        self.size = size
+        self.blocks = {}
+
+    def block(self, color):
+        block = self.blocks.get(color)
+        if block is None:
+            block = pygame.Surface((self.size, self.size))
+            block.fill(color)
+            if self.size >= 4 and color != Colors.BLACK:
+                edge = tuple(channel // 2 for channel in color)
+                pygame.draw.rect(block, edge, (0, 0, self.size, self.size), 1)
+            if pygame.display.get_surface() is not None:
+                block = block.convert()
+            self.blocks[color] = block
+        return block
+
+
+class Board:
+    def __init__(self, game, x, y, atlas, font):
+        self.game = game
+        self.x = x
+        self.y = y
+        self.atlas = atlas
+        self.font = font
+        field = game.game_field
+        self.cells = [[None] * field.columns for _ in range(field.rows)]  # Colors on screen
+        self.state = None
+        self.label = None
+
+    def state_key(self):
+        tetris = self.game.tetris
+        return tetris.state_hash(), tetris.x, tetris.y, self.game.score.score, tetris.game_over
+
+    def draw(self, surface, dirty):
+        # Blit the cells that changed since the last draw and add their area to dirty
+        state = self.state_key()
+        if state == self.state:
+            return
+        self.state = state
+
+        tetris = self.game.tetris
+        piece = {}
+        if not tetris.game_over:
+            shape, color = tetris.current_piece
+            for i, row in enumerate(shape):
+                for j, filled in enumerate(row):
+                    if filled:
+                        piece[(tetris.y + i, tetris.x + j)] = color
+
+        size = self.atlas.size
+        top = bottom = left = right = None
+        for i, row in enumerate(self.game.game_field.board):
+            drawn = self.cells[i]
+            for j, color in enumerate(row):
+                color = piece.get((i, j), color)
+                if drawn[j] != color:
+                    drawn[j] = color
+                    surface.blit(self.atlas.block(color), (self.x + j * size, self.y + i * size))
+                    if top is None:
+                        top = i
+                        left = right = j
+                    bottom = i
+                    left = min(left, j)
+                    right = max(right, j)
+        if top is not None:
+            dirty.append(pygame.Rect(self.x + left * size, self.y + top * size,
+                                     (right - left + 1) * size, (bottom - top + 1) * size))
+
+        label = (self.game.score.score, tetris.game_over)
+        if label != self.label:
+            self.label = label
+            field = self.game.game_field
+            area = pygame.Rect(self.x, self.y + field.rows * size + 1, field.columns * size, LABEL_HEIGHT)
+            surface.fill(Colors.BLACK, area)
+            text = self.font.render(str(self.game.score.score), True,
+                                    Colors.RED if tetris.game_over else Colors.WHITE)
+            surface.blit(text, area.topleft)
+            dirty.append(area)
+
+
+def layout(count, width, height, board_columns=COLUMNS, board_rows=ROWS):
+    # Grid with the most columns/rows split that gives the largest block size
+    best = None
+    for columns in range(1, count + 1):
+        rows = math.ceil(count / columns)
+        size = min(width // (columns * (board_columns + TILE_MARGIN)),
+                   (height - rows * LABEL_HEIGHT) // (rows * (board_rows + TILE_MARGIN)))
+        if best is None or size > best[0]:
+            best = (size, columns, rows)
+    return best
+
+
+class SpectatorWall:
+    def __init__(self, games, surface, ticks_per_frame=1):
+        self.games = games
+        self.surface = surface
+        self.ticks_per_frame = ticks_per_frame
+        width, height = surface.get_size()
+        # Tiles are sized for the largest board on the wall
+        board_columns = max(game.game_field.columns for game in games)
+        board_rows = max(game.game_field.rows for game in games)
+        size, columns, rows = layout(len(games), width, height, board_columns, board_rows)
+        if size < 1:
+            raise ValueError(f"{len(games)} boards do not fit in {width}x{height}")
+        self.atlas = BlockAtlas(size)
+        font = pygame.font.Font(None, LABEL_HEIGHT + 4)
+        tile_width = (board_columns + TILE_MARGIN) * size
+        tile_height = (board_rows + TILE_MARGIN) * size + LABEL_HEIGHT
+        self.boards = []
+        for index, game in enumerate(games):
+            row, column = divmod(index, columns)
+            self.boards.append(Board(game, column * tile_width, row * tile_height, self.atlas, font))
+
+    def tick(self):
+        for game in self.games:
+            if game.tetris.game_over:
+                continue
+            for _ in range(self.ticks_per_frame):
+                game.ticks += 1
+                game.apply_gravity()
+                game.update_speed()
+
+    def draw(self):
+        # Returns the rectangles that changed this frame
+        dirty = []
+        for board in self.boards:
+            board.draw(self.surface, dirty)
+        return dirty
+
+    def finished(self):
+        return all(game.tetris.game_over for game in self.games)
+
+    async def run(self, framerate=FPS):
+        clock = FrameClock()
+        self.surface.fill(Colors.BLACK)
+        self.draw()
+        pygame.display.flip()
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    return
+            self.tick()
+            dirty = self.draw()
+            if dirty:
+                pygame.display.update(dirty)
+            await clock.tick(framerate)
+
+
+def make_games(args, player_bot):
+    games = []
+    if args.replays:
+        for replay in load_replays(args.replays):
+            games.append(Game(ReplayPlayer(replay), seed=replay.seed, renderer=NullRenderer()))
+            if len(games) == args.games:
+                break
+    else:
+        for seed in range(args.seed, args.seed + args.games):
+            games.append(Game(player_bot, move_budget=args.budget, seed=seed, renderer=NullRenderer(),
+                              columns=args.columns, rows=args.rows))
+    return games
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch many bot or replay games in one window")
+    parser.add_argument("--games", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first bot game")
+    parser.add_argument("--replays", help="play back the games in a replay JSONL file instead")
+    parser.add_argument("--budget", type=float, default=0.002, help="bot thinking time per piece")
+    parser.add_argument("--speed", type=int, default=1, help="game ticks per frame")
+    parser.add_argument("--columns", type=int, default=COLUMNS, help="board width of the bot games")
+    parser.add_argument("--rows", type=int, default=ROWS, help="board height of the bot games")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args(argv)
+
+    # One greedy bot serves every board; its caches are keyed by board hash
+    player_bot = bot.ExpectimaxBot(depth=1)
+    screen = pygame.display.set_mode((args.width, args.height))
+    pygame.display.set_caption('Petris - spectator wall')
+    wall = SpectatorWall(make_games(args, player_bot), screen, args.speed)
+    try:
+        asyncio.run(wall.run())
+    finally:
+        player_bot.close()
+        pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())